@@ -1,7 +1,11 @@
+from timeit import default_timer as timer
+
 from CSP import *
+from Domains import Domains, VariableDomains
+from Stats import SolverStats
 
 
-def revise(varI: Variable, constraint: Constraint, varJ: Variable) -> bool:
+def revise(varI: Variable, constraint: Constraint, varJ: Variable, domains: Domains = None, stats: SolverStats = None) -> bool:
     """
     Check for every value in the first variable's domain if exist a value of neighbour's domain compatible with it;
     if it doesn't exist, the value will be hidden
@@ -9,26 +13,44 @@ def revise(varI: Variable, constraint: Constraint, varJ: Variable) -> bool:
     :param varI: first variable
     :param constraint: constraint between the variables
     :param varJ: second variable
+    :param domains: store of the actual domains; if None, values are hidden on the variables themselves
+    :param stats: statistics to update; if None, nothing is counted
     :return: True if the domain has been reduced, False otherwise
     """
+    if domains is None:
+        domains = VariableDomains()
+    if stats is not None:
+        stats.revisions += 1
+        constraint = stats.countChecks(constraint)
     revised = False
-    for valueX in varI.getActualDomain():
-        for valueY in varJ.getActualDomain():
+    valuesJ = domains.getActualDomain(varJ)
+    for valueX in domains.getActualDomain(varI):
+        for valueY in valuesJ:
             if constraint(valueX, valueY):
                 break
         else:
-            varI.hideValue(valueX)
+            domains.hideValue(varI, valueX)
             revised = True
+            if stats is not None:
+                stats.pruned += 1
     return revised
 
 
-def AC3(csp: CSP) -> bool:
+def AC3(csp: CSP, domains: Domains = None, stats: SolverStats = None) -> bool:
     """
     Reduce CSP's variable's domain by inference, maintaining arc consistency
     Execution time: O(nd^3) d=max cardinality
     :param csp: CSP
+    :param domains: store of the actual domains to reduce; if None, values are hidden on the variables themselves
+    :param stats: statistics to update (time in phase 'ac3'); if None, nothing is counted
     :return: False if the CSP is unsatisfiable
     """
+    if domains is None:
+        domains = VariableDomains()
+    if stats is not None:
+        start = timer()
+        stats.enterPhase('ac3')
+
     def unaryRevise(var_i: Variable, constraint_i: Constraint, value_i: Any) -> None:
         """
         Check for every value of the variable if it is compatible with a unary constraint involving this variable;
@@ -38,9 +60,13 @@ def AC3(csp: CSP) -> bool:
         :param value_i: value
         :return: None
         """
-        for valueX in var_i.getActualDomain():
+        if stats is not None:
+            constraint_i = stats.countChecks(constraint_i)
+        for valueX in domains.getActualDomain(var_i):
             if not constraint_i(valueX, value_i):
-                var_i.hideValue(valueX)
+                domains.hideValue(var_i, valueX)
+                if stats is not None:
+                    stats.pruned += 1
 
     # Inference over the unary constraint
     for var in csp.getUnaryConstraints():
@@ -48,14 +74,17 @@ def AC3(csp: CSP) -> bool:
             unaryRevise(var, csp.findUnaryConstraint(var, value), value)
 
     # Inference over the binary constraints
-    s = csp.getEdges()
+    s = set(csp.getEdges())       # own copy, the csp gives a read-only view
     while len(s) is not 0:
         edge = s.pop()      # Take an edge...
         constraint = csp.findBinaryCostraint(edge[0], edge[1])
         varI = edge[0]
         varJ = edge[1]
-        if revise(varI, constraint, varJ):      # ... and analise the relative constraint. If has been made inference, we have to check something
-            if varI.getActualDomainSize() == 0:     # If a domain is empty, the csp is unsatisfiable
+        if revise(varI, constraint, varJ, domains, stats):      # ... and analise the relative constraint. If has been made inference, we have to check something
+            if domains.getActualDomainSize(varI) == 0:     # If a domain is empty, the csp is unsatisfiable
+                if stats is not None:
+                    stats.addTime('ac3', timer() - start)
+                    stats.exitPhase('ac3')
                 return False
             otherConstraints = csp.getBinaryConstraintsForVar(varI)     # get others constraints involving inferenced variable...
             otherEdges = set()
@@ -63,4 +92,7 @@ def AC3(csp: CSP) -> bool:
                 if var != varJ:
                     otherEdges.add((var, varI))         # ... convert them to edges ...
             s = s.union(otherEdges)         # ... and add them to the set of edges to analise
+    if stats is not None:
+        stats.addTime('ac3', timer() - start)
+        stats.exitPhase('ac3')
     return True
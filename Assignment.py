@@ -1,55 +1,135 @@
 from __future__ import annotations
 
 from Variable import Variable
-from typing import Any, Dict, Set
-from copy import copy
+from typing import Any, Dict, Iterable, List, Optional, Set
 
 
 class AssignmentError(Exception):
     pass
 
 
+_UNASSIGNED = object()      # sentinel of the slots of unassigned variables
+
+
+class _Layout:
+    """
+    Compiled variable IDs, shared by an assignment and all its copies.
+    Every variable gets a slot (its ID) and, on its first inference, every value of its initial domain a bit of the inference mask
+    """
+    __slots__ = ('ids', 'variables', 'values', 'index')
+
+    def __init__(self):
+        self.ids: Dict[Variable, int] = {}
+        self.variables: List[Variable] = []
+        self.values: List[Optional[List[Any]]] = []
+        self.index: List[Optional[Dict[Any, int]]] = []
+
+    def compile(self, var: Variable) -> int:
+        """
+        :param var: variable of interest
+        :return: variable's ID, assigned on its first use
+        """
+        id = self.ids.get(var)
+        if id is None:
+            id = len(self.variables)
+            self.ids[var] = id
+            self.variables.append(var)
+            self.values.append(None)
+            self.index.append(None)
+        return id
+
+    def bits(self, id: int) -> Dict[Any, int]:
+        """
+        :param id: variable's ID
+        :return: bit of every value of the variable's initial domain
+        """
+        index = self.index[id]
+        if index is None:
+            values = list(self.variables[id].getInitialDomain())
+            index = {value: i for i, value in enumerate(values)}
+            self.values[id] = values
+            self.index[id] = index
+        return index
+
+
 class Assignment:
     """
     This class represent an assignment.
     It contains also value to be hidden from other variable after an assignment and the inference
     An assignment is null if its attribute "null" is true
+    Values are kept in an array indexed by compiled variable ID (a sentinel marks the unassigned ones) and the inferences
+    as a bitmask over the variable's initial domain, so a copy is two flat array copies and reads never copy anything
     """
-    def __init__(self):
-        self._assignment: Dict[Variable, Any] = {}
-        self._inferences: Dict[Variable, Set] = {}
+    __slots__ = ('_layout', '_values', '_inferences', '_count', '_null')
+
+    def __init__(self, variables: Iterable[Variable] = ()):
+        """
+        :param variables: variables to compile upfront; the others get their ID on their first use
+        :raise AssignmentError: if an element of variables param is not a Variable
+        """
+        self._layout = _Layout()
+        for var in variables:
+            if not isinstance(var, Variable):
+                raise AssignmentError
+            self._layout.compile(var)
+        size = len(self._layout.variables)
+        self._values: List[Any] = [_UNASSIGNED] * size
+        self._inferences: List[int] = [0] * size
+        self._count: int = 0
         self._null: bool = False
 
     def __copy__(self):
         """
-        Defensive copy
+        Defensive copy, sharing the compiled IDs
         """
-        newAssignment = Assignment()
-        for var in self._assignment:
-            newAssignment.addVarAssigned(var, self._assignment[var])
-        for var in self._inferences:
-            for value in self._inferences[var]:
-                newAssignment.addVarInferenced(var, value)
+        newAssignment = Assignment.__new__(Assignment)
+        newAssignment._layout = self._layout
+        newAssignment._values = self._values.copy()
+        newAssignment._inferences = self._inferences.copy()
+        newAssignment._count = self._count
+        newAssignment._null = self._null
         return newAssignment
 
     def __add__(self, other: Assignment) -> Assignment:
         """
         Add method for assignment. Only the assigned variable will be united, the inferences will be ignored
         """
-        newAssignment = Assignment()
-        for var in self._assignment:
-            newAssignment.addVarAssigned(var, self._assignment[var])
-        for var in other.getAssignment():
-            newAssignment.addVarAssigned(var, other.getAssignment()[var])
+        newAssignment = self.__copy__()
+        newAssignment._inferences = [0] * len(self._inferences)
+        newAssignment._null = False
+        for var, value in other._items():
+            newAssignment.addVarAssigned(var, value)
         return newAssignment
 
+    def _slot(self, var: Variable) -> int:
+        """
+        :param var: variable to be written
+        :return: variable's ID, growing the arrays if the variable is new to them
+        """
+        id = self._layout.compile(var)
+        if id >= len(self._values):
+            grow = len(self._layout.variables) - len(self._values)
+            self._values.extend([_UNASSIGNED] * grow)
+            self._inferences.extend([0] * grow)
+        return id
+
+    def _items(self) -> Iterable[tuple]:
+        """
+        :return: generator of the (variable, value) pairs of the assigned variables
+        """
+        variables = self._layout.variables
+        for id, value in enumerate(self._values):
+            if value is not _UNASSIGNED:
+                yield variables[id], value
+
     def setNull(self) -> None:
         """
         Set the assignment as null
         """
         self._null = True
-        self._assignment.clear()
-        self._inferences.clear()
+        self._values = [_UNASSIGNED] * len(self._values)
+        self._inferences = [0] * len(self._inferences)
+        self._count = 0
 
     def isNull(self) -> bool:
         """
@@ -69,7 +149,10 @@ class Assignment:
             raise AssignmentError
 
         if var.validValue(value):
-            self._assignment[var] = value
+            id = self._slot(var)
+            if self._values[id] is _UNASSIGNED:
+                self._count += 1
+            self._values[id] = value
         else:
             raise AssignmentError
 
@@ -77,19 +160,50 @@ class Assignment:
         """
         Removes an assignment for variable
         :param var: variable to be removed
+        :raise AssignmentError: if the variable isn't assigned
         """
         if self._null:
             raise AssignmentError
         if not isinstance(var, Variable):
             raise AssignmentError
+        if not self.isAssigned(var):
+            raise AssignmentError
+
+        self._values[self._layout.ids[var]] = _UNASSIGNED
+        self._count -= 1
 
-        self._assignment.pop(var)
+    def isAssigned(self, var: Variable) -> bool:
+        """
+        Execution time: O(1)
+        :param var: variable of interest
+        :return: True if the variable has been assigned
+        """
+        id = self._layout.ids.get(var)
+        return id is not None and id < len(self._values) and self._values[id] is not _UNASSIGNED
+
+    def getValue(self, var: Variable) -> Any:
+        """
+        Execution time: O(1)
+        :param var: variable of interest
+        :return: value assigned to the variable
+        :raise AssignmentError: if the variable isn't assigned
+        """
+        if not self.isAssigned(var):
+            raise AssignmentError
+        return self._values[self._layout.ids[var]]
+
+    def countAssigned(self) -> int:
+        """
+        Execution time: O(1)
+        :return: number of assigned variables
+        """
+        return self._count
 
     def getAssignment(self) -> Dict[Variable, Any]:
         """
         :return: defensive copy of assignment's values
         """
-        return self._assignment.copy()
+        return dict(self._items())
 
     def addVarInferenced(self, var: Variable, value: Any) -> None:
         """
@@ -102,12 +216,35 @@ class Assignment:
         if not isinstance(var, Variable):
             raise AssignmentError
 
-        if var.validValue(value):
-            if var not in self._inferences:
-                self._inferences[var] = set()
-            self._inferences[var].add(value)
-        else:
+        id = self._slot(var)
+        bit = self._layout.bits(id).get(value)
+        if bit is None:
             raise AssignmentError
+        self._inferences[id] |= 1 << bit
+
+    def isInferenced(self, var: Variable, value: Any) -> bool:
+        """
+        Execution time: O(1)
+        :param var: variable of interest
+        :param value: value of interest
+        :return: True if the value has been hidden from the variable
+        """
+        id = self._layout.ids.get(var)
+        if id is None or id >= len(self._inferences) or self._inferences[id] == 0:
+            return False
+        bit = self._layout.bits(id).get(value)
+        return bit is not None and self._inferences[id] >> bit & 1 == 1
+
+    def countInferencesForVar(self, var: Variable) -> int:
+        """
+        Execution time: O(1)
+        :param var: variable of interest
+        :return: number of values hidden from the variable
+        """
+        id = self._layout.ids.get(var)
+        if id is None or id >= len(self._inferences):
+            return 0
+        return bin(self._inferences[id]).count('1')
 
     def getInferencesForVar(self, var: Variable) -> Set:
         """
@@ -118,16 +255,19 @@ class Assignment:
         if not isinstance(var, Variable):
             raise AssignmentError
 
-        if var in self._inferences:
-            return self._inferences[var].copy()
-        else:
+        id = self._layout.ids.get(var)
+        if id is None or id >= len(self._inferences) or self._inferences[id] == 0:
             return set()
+        mask = self._inferences[id]
+        values = self._layout.values[id]
+        return {values[i] for i in range(len(values)) if mask >> i & 1}
 
     def getInferences(self) -> Dict[Variable, Set]:
         """
         :return: defensive copy of hidden values
         """
-        return self._inferences.copy()
+        variables = self._layout.variables
+        return {variables[id]: self.getInferencesForVar(variables[id]) for id, mask in enumerate(self._inferences) if mask != 0}
 
     def printAssignment(self) -> None:
         """
@@ -136,7 +276,273 @@ class Assignment:
         if self._null:
             print('null assignment')
             return
-        for var in self._assignment:
-            print(var.getName() + ": " + str(self._assignment[var]))
-        if len(self._assignment) == 0:
+        for var, value in self._items():
+            print(var.getName() + ": " + str(value))
+        if self._count == 0:
             print('empty assignment')
+
+
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+
+
+class _Trie:
+    """
+    Persistent vector: a path-copying trie with 32-way nodes (tuples) indexed by the bits of the position.
+    It's never modified: set returns a new trie sharing every node off the path to the position
+    """
+    __slots__ = ('_root', '_shift', '_default')
+
+    def __init__(self, default: Any, root: Optional[tuple] = None, shift: int = 0):
+        """
+        :param default: value of the positions never set
+        :param root: root node, None if the trie is empty
+        :param shift: bits to shift a position to find its child in the root
+        """
+        self._root = root
+        self._shift = shift
+        self._default = default
+
+    def get(self, i: int) -> Any:
+        """
+        Execution time: O(log n)
+        :param i: position of interest
+        :return: value at the position
+        """
+        node = self._root
+        shift = self._shift
+        if node is None or i >> shift >> _BITS != 0:
+            return self._default
+        while shift > 0:
+            node = node[i >> shift & _MASK]
+            if node is None:
+                return self._default
+            shift -= _BITS
+        return node[i & _MASK]
+
+    def set(self, i: int, value: Any) -> _Trie:
+        """
+        Execution time: O(log n)
+        :param i: position to be written
+        :param value: value to be written
+        :return: new trie, with value at the position
+        """
+        root = self._root
+        shift = self._shift
+        while i >> shift >> _BITS != 0:     # the trie grows at the top
+            if root is not None:
+                root = (root,) + (None,) * (_WIDTH - 1)
+            shift += _BITS
+        return _Trie(self._default, self._assoc(root, shift, i, value), shift)
+
+    def _assoc(self, node: Optional[tuple], shift: int, i: int, value: Any) -> tuple:
+        """
+        :return: copy of the node with value at the position, sharing the untouched children
+        """
+        if shift == 0:
+            leaf = list(node) if node is not None else [self._default] * _WIDTH
+            leaf[i & _MASK] = value
+            return tuple(leaf)
+        children = list(node) if node is not None else [None] * _WIDTH
+        j = i >> shift & _MASK
+        children[j] = self._assoc(children[j], shift - _BITS, i, value)
+        return tuple(children)
+
+    def items(self) -> Iterable[tuple]:
+        """
+        :return: generator of the (position, value) pairs whose value isn't the default one, in order of position
+        """
+        def _visit(node: tuple, shift: int, base: int) -> Iterable[tuple]:
+            for j, child in enumerate(node):
+                if shift == 0:
+                    if child is not self._default:
+                        yield base + j, child
+                elif child is not None:
+                    yield from _visit(child, shift - _BITS, base + (j << shift))
+
+        if self._root is not None:
+            yield from _visit(self._root, self._shift, 0)
+
+
+class PersistentAssignment(Assignment):
+    """
+    This class represent an assignment that shares its structure with its copies.
+    Values and inferences are kept in two path-copying tries indexed by compiled variable ID: a copy costs O(1) and
+    every change O(log n), copying only the path to the changed variable, so many partial assignments (e.g. a frontier
+    of the search) can be kept alive at once
+    """
+    __slots__ = ()
+
+    def __init__(self, variables: Iterable[Variable] = ()):
+        """
+        :param variables: variables to compile upfront; the others get their ID on their first use
+        :raise AssignmentError: if an element of variables param is not a Variable
+        """
+        super().__init__(variables)
+        self._values: _Trie = _Trie(_UNASSIGNED)
+        self._inferences: _Trie = _Trie(0)
+
+    def __copy__(self):
+        """
+        Copy in O(1): the tries are shared, since they are never modified
+        """
+        newAssignment = PersistentAssignment.__new__(PersistentAssignment)
+        newAssignment._layout = self._layout
+        newAssignment._values = self._values
+        newAssignment._inferences = self._inferences
+        newAssignment._count = self._count
+        newAssignment._null = self._null
+        return newAssignment
+
+    def __add__(self, other: Assignment) -> Assignment:
+        """
+        Add method for assignment. Only the assigned variable will be united, the inferences will be ignored
+        """
+        newAssignment = self.__copy__()
+        newAssignment._inferences = _Trie(0)
+        newAssignment._null = False
+        for var, value in other._items():
+            newAssignment.addVarAssigned(var, value)
+        return newAssignment
+
+    def _items(self) -> Iterable[tuple]:
+        """
+        :return: generator of the (variable, value) pairs of the assigned variables
+        """
+        variables = self._layout.variables
+        for id, value in self._values.items():
+            yield variables[id], value
+
+    def setNull(self) -> None:
+        """
+        Set the assignment as null
+        """
+        self._null = True
+        self._values = _Trie(_UNASSIGNED)
+        self._inferences = _Trie(0)
+        self._count = 0
+
+    def addVarAssigned(self, var: Variable, value: Any) -> None:
+        """
+        Adds an assignment for variable
+        :param var: variable to be assigned
+        :param value: value to be assigned
+        """
+        if self._null:
+            raise AssignmentError
+        if not isinstance(var, Variable):
+            raise AssignmentError
+
+        if var.validValue(value):
+            id = self._layout.compile(var)
+            if self._values.get(id) is _UNASSIGNED:
+                self._count += 1
+            self._values = self._values.set(id, value)
+        else:
+            raise AssignmentError
+
+    def removeVarAssigned(self, var: Variable) -> None:
+        """
+        Removes an assignment for variable
+        :param var: variable to be removed
+        :raise AssignmentError: if the variable isn't assigned
+        """
+        if self._null:
+            raise AssignmentError
+        if not isinstance(var, Variable):
+            raise AssignmentError
+        if not self.isAssigned(var):
+            raise AssignmentError
+
+        self._values = self._values.set(self._layout.ids[var], _UNASSIGNED)
+        self._count -= 1
+
+    def isAssigned(self, var: Variable) -> bool:
+        """
+        Execution time: O(log n)
+        :param var: variable of interest
+        :return: True if the variable has been assigned
+        """
+        id = self._layout.ids.get(var)
+        return id is not None and self._values.get(id) is not _UNASSIGNED
+
+    def getValue(self, var: Variable) -> Any:
+        """
+        Execution time: O(log n)
+        :param var: variable of interest
+        :return: value assigned to the variable
+        :raise AssignmentError: if the variable isn't assigned
+        """
+        id = self._layout.ids.get(var)
+        value = self._values.get(id) if id is not None else _UNASSIGNED
+        if value is _UNASSIGNED:
+            raise AssignmentError
+        return value
+
+    def addVarInferenced(self, var: Variable, value: Any) -> None:
+        """
+        Adds a value to be hidden from a variable, after an assignment
+        :param var: variable to hide
+        :param value: value to hide
+        """
+        if self._null:
+            raise AssignmentError
+        if not isinstance(var, Variable):
+            raise AssignmentError
+
+        id = self._layout.compile(var)
+        bit = self._layout.bits(id).get(value)
+        if bit is None:
+            raise AssignmentError
+        self._inferences = self._inferences.set(id, self._inferences.get(id) | 1 << bit)
+
+    def _mask(self, var: Variable) -> int:
+        """
+        :return: inference mask of the variable
+        """
+        id = self._layout.ids.get(var)
+        return self._inferences.get(id) if id is not None else 0
+
+    def isInferenced(self, var: Variable, value: Any) -> bool:
+        """
+        Execution time: O(log n)
+        :param var: variable of interest
+        :param value: value of interest
+        :return: True if the value has been hidden from the variable
+        """
+        mask = self._mask(var)
+        if mask == 0:
+            return False
+        bit = self._layout.bits(self._layout.ids[var]).get(value)
+        return bit is not None and mask >> bit & 1 == 1
+
+    def countInferencesForVar(self, var: Variable) -> int:
+        """
+        Execution time: O(log n)
+        :param var: variable of interest
+        :return: number of values hidden from the variable
+        """
+        return bin(self._mask(var)).count('1')
+
+    def getInferencesForVar(self, var: Variable) -> Set:
+        """
+        Returns all the hidden values for a variable
+        :param var: variable to search for hidden values
+        :return: hidden values
+        """
+        if not isinstance(var, Variable):
+            raise AssignmentError
+
+        mask = self._mask(var)
+        if mask == 0:
+            return set()
+        values = self._layout.values[self._layout.ids[var]]
+        return {values[i] for i in range(len(values)) if mask >> i & 1}
+
+    def getInferences(self) -> Dict[Variable, Set]:
+        """
+        :return: defensive copy of hidden values
+        """
+        variables = self._layout.variables
+        return {variables[id]: self.getInferencesForVar(variables[id]) for id, mask in self._inferences.items() if mask != 0}
@@ -1,7 +1,11 @@
 from typing import Union
+from timeit import default_timer as timer
 
 from CSP import *
 from AC3 import AC3
+from Domains import Domains, VariableDomains
+from Stats import SolverStats
+from Trace import SearchHooks
 
 
 def orderVariables(csp: CSP, assignment: Assignment) -> Variable:
@@ -11,26 +15,29 @@ def orderVariables(csp: CSP, assignment: Assignment) -> Variable:
     :param assignment: partial assignment
     :return: first variable
     """
-    varAssignment: Dict[Variable] = assignment.getAssignment()
-    unassigned = [var for var in list(csp.getVariables() - varAssignment.keys())]
-    unassigned.sort(key=lambda var: ((var.getActualDomainSize() - len(assignment.getInferencesForVar(var))), -len(csp.getBinaryConstraintsForVar(var))))
+    unassigned = [var for var in csp.getVariables() if not assignment.isAssigned(var)]
+    unassigned.sort(key=lambda var: ((var.getActualDomainSize() - assignment.countInferencesForVar(var)), -len(csp.getBinaryConstraintsForVar(var))))
     return unassigned[0]
 
 
-def orderDomainValues(csp: CSP, assignment: Assignment, var: Variable) -> List:
+def orderDomainValues(csp: CSP, assignment: Assignment, var: Variable, stats: SolverStats = None) -> List:
     """
     Orders the remaining values from a variable's domain following Least Constraining Value (minimum number of crossouts)
     :param csp: the csp from which variable is extract
     :param assignment: partial assignment
     :param var: variable of interest
+    :param stats: statistics to update; if None, nothing is counted
     :return: list of values
     """
 
     def countCrossout(var1: Variable, value: Any) -> int:
         count = 0
         for var2 in csp.getBinaryConstraintsForVar(var1):
+            constraint = csp.findBinaryCostraint(var1, var2)
+            if stats is not None:
+                constraint = stats.countChecks(constraint)
             for value2 in var2.getActualDomain():
-                if not csp.findBinaryCostraint(var1, var2)(value, value2):
+                if not constraint(value, value2):
                     count += 1
         return count
 
@@ -39,15 +46,23 @@ def orderDomainValues(csp: CSP, assignment: Assignment, var: Variable) -> List:
     return values
 
 
-def MAC(csp: CSP, assignment: Assignment, s: Set[tuple]) -> bool:
+def MAC(csp: CSP, assignment: Assignment, s: Set[tuple], domains: Domains = None, stats: SolverStats = None, hooks: SearchHooks = None) -> bool:
     """
     Maintaining Arc Consistency
     Check if, given a partial assignment, is possible to complete it satisfying all constraints. It is an AC-3 modified
     :param csp: the csp
     :param assignment: partial assignment
     :param s: starting set of edges
+    :param domains: store of the actual domains to read; if None, the variables' actual domains are used
+    :param stats: statistics to update; if None, nothing is counted
+    :param hooks: receiver of prune and wipeout events; if None, no event is sent
     :return: True if it's possible to complete the assignment, False if not
     """
+    if domains is None:
+        domains = VariableDomains()
+    if stats is not None:
+        stats.macCalls += 1
+    s = set(s)      # own worklist: s can be a read-only view (as given by getNeighbour)
 
     def revise(varI_i: Variable, constraint_i: Constraint, varJ_i: Variable, assignment_i: Assignment) -> bool:
         """
@@ -60,21 +75,22 @@ def MAC(csp: CSP, assignment: Assignment, s: Set[tuple]) -> bool:
         :return: True if the domain has been reduced, False otherwise
         """
         revised = False
+        if stats is not None:
+            stats.revisions += 1
+            constraint_i = stats.countChecks(constraint_i)
 
-        inferences = assignment_i.getInferences()
-        varAssignment = assignment_i.getAssignment()
-        if varI_i in varAssignment:       # if var has been assigned, we check for that value...
-            valuesI = [varAssignment[varI_i]]
+        if assignment_i.isAssigned(varI_i):       # if var has been assigned, we check for that value...
+            valuesI = [assignment_i.getValue(varI_i)]
         else:       # ... else for all actual values in domain
-            valuesI = varI_i.getActualDomain()
-            if varI_i in inferences:
-                valuesI -= inferences[varI_i]
-        if varJ_i in varAssignment:       # if var has been assigned, we check for that value...
-            valuesJ = [varAssignment[varJ_i]]
+            valuesI = domains.getActualDomain(varI_i)
+            if assignment_i.countInferencesForVar(varI_i) != 0:
+                valuesI -= assignment_i.getInferencesForVar(varI_i)
+        if assignment_i.isAssigned(varJ_i):       # if var has been assigned, we check for that value...
+            valuesJ = [assignment_i.getValue(varJ_i)]
         else:       # ... else for all actual values in domain
-            valuesJ = varJ_i.getActualDomain()
-            if varJ_i in inferences:
-                valuesJ -= inferences[varJ_i]
+            valuesJ = domains.getActualDomain(varJ_i)
+            if assignment_i.countInferencesForVar(varJ_i) != 0:
+                valuesJ -= assignment_i.getInferencesForVar(varJ_i)
 
         for valueX in valuesI:          # for all the values to be checked...
             for valueY in valuesJ:          # we control all the values possible in second variable's actual domain
@@ -83,6 +99,10 @@ def MAC(csp: CSP, assignment: Assignment, s: Set[tuple]) -> bool:
             else:
                 assignment_i.addVarInferenced(varI_i, valueX)       # if none is compatible, then we hide the value
                 revised = True
+                if stats is not None:
+                    stats.pruned += 1
+                if hooks is not None:
+                    hooks.prune(varI_i, valueX, assignment_i.countAssigned())
         return revised
 
     while len(s) is not 0:
@@ -90,9 +110,11 @@ def MAC(csp: CSP, assignment: Assignment, s: Set[tuple]) -> bool:
         constraint = csp.findBinaryCostraint(edge[0], edge[1])
         varI = edge[0]
         varJ = edge[1]
-        if varI not in assignment.getAssignment().keys() or varJ not in assignment.getAssignment().keys():        # we'll do inference only if at least one of the variables has not been assigned
+        if not assignment.isAssigned(varI) or not assignment.isAssigned(varJ):        # we'll do inference only if at least one of the variables has not been assigned
             if revise(varI, constraint, varJ, assignment):          # ... and analise the relative constraint. If has been made inference, we have to check something
-                if len(varI.getActualDomain() - assignment.getInferencesForVar(varI)) == 0:        # If a domain is empty, the csp is unsatisfiable
+                if len(domains.getActualDomain(varI) - assignment.getInferencesForVar(varI)) == 0:        # If a domain is empty, the csp is unsatisfiable
+                    if hooks is not None:
+                        hooks.wipeout(varI, assignment.countAssigned())
                     return False
                 otherConstraints = csp.getBinaryConstraintsForVar(varI)       # get others constraints involving inferenced variable...
                 otherEdges = set()
@@ -103,11 +125,14 @@ def MAC(csp: CSP, assignment: Assignment, s: Set[tuple]) -> bool:
     return True
 
 
-def backtrack(csp: CSP) -> Assignment:
+def backtrack(csp: CSP, *, persistent: bool = False, stats: SolverStats = None, hooks: SearchHooks = None) -> Assignment:
     """
     Given a csp, find a possible assignment
     Execution time: O(n^d) d=max cardinality
     :param csp: csp of interest
+    :param persistent: if True the search nodes share their assignments' structure (PersistentAssignment)
+    :param stats: statistics to update (time in phases 'ac3' and 'search'); if None, nothing is counted
+    :param hooks: receiver of the search events (assign, undo, prune, wipeout, backtrack); if None, no event is sent
     :return: assignment that satisfies the csp, eventually null if it is unsatisfiable
     """
 
@@ -119,26 +144,43 @@ def backtrack(csp: CSP) -> Assignment:
         :return: assignment if it exist, None otherwise
         """
         if assignment_i is None:      # if it's the init call, we run AC-3 and we initialize an assignment
-            if not AC3(csp_i):
+            if not AC3(csp_i, stats=stats):
                 return None
-            assignment_i = Assignment()
+            assignment_i = PersistentAssignment(csp_i.getVariables()) if persistent else Assignment(csp_i.getVariables())
 
-        if len(assignment_i.getAssignment()) == csp_i.countVariables():     # if the assignment is complete, we can return it
+        if assignment_i.countAssigned() == csp_i.countVariables():     # if the assignment is complete, we can return it
             return assignment_i
 
         var = orderVariables(csp_i, assignment_i)
-        values = orderDomainValues(csp_i, assignment_i, var)
+        values = orderDomainValues(csp_i, assignment_i, var, stats)
 
         for value in values:
+            if stats is not None:
+                stats.nodes += 1
             localAssignment = copy(assignment_i)            # we try to assign a var in a local copy of assignment
             localAssignment.addVarAssigned(var, value)
-            if MAC(csp_i, localAssignment, csp_i.getNeighbour(var)):      # if it's possible to complete the assignment, we iterate...
+            if hooks is not None:
+                hooks.assign(var, value, localAssignment.countAssigned())
+            if MAC(csp_i, localAssignment, csp_i.getNeighbour(var), stats=stats, hooks=hooks):      # if it's possible to complete the assignment, we iterate...
                 result = backtrackSearch(csp_i, localAssignment)
                 if result is not None:      # ... if it fails, we go back and propagate the None result
                     return result   # if the recursion arrive to a None, we don't want to propagate it, but we want to try next value
+            if hooks is not None:
+                hooks.undo(var, value, localAssignment.countAssigned())
+        if stats is not None:
+            stats.backtracks += 1
+        if hooks is not None:
+            hooks.backtrack(var, assignment_i.countAssigned())
         return None
 
+    if stats is not None:
+        start = timer()
+        ac3Time = stats.phases.get('ac3', 0.0)
+        stats.enterPhase('search')
     assignment = backtrackSearch(csp)
+    if stats is not None:       # the time of the initial AC-3 is in its own phase
+        stats.exitPhase('search')
+        stats.addTime('search', timer() - start - (stats.phases.get('ac3', 0.0) - ac3Time))
     if assignment is None:
         nullAssignment = Assignment()
         nullAssignment.setNull()
@@ -158,7 +200,7 @@ def allSolutions(csp: CSP, *, count: bool = False, assignment: Assignment = None
     """
     if assignment is None:  # if it's the init call, we run AC-3 and we initialize an assignment
         AC3(csp)
-        assignment = Assignment()
+        assignment = Assignment(csp.getVariables())
 
     if solutions is None:
         if count:
@@ -166,14 +208,14 @@ def allSolutions(csp: CSP, *, count: bool = False, assignment: Assignment = None
         else:
             solutions = []
 
-    unassigned = [var for var in list(csp.getVariables() - assignment.getAssignment().keys())]
+    unassigned = [var for var in csp.getVariables() if not assignment.isAssigned(var)]
     var = unassigned[0]
     values = list(var.getActualDomain() - assignment.getInferencesForVar(var))
     for value in values:
         localAssignment = copy(assignment)        # we try to assign a var in a local copy of assignment
         localAssignment.addVarAssigned(var, value)
         if csp.assignmentConsistency(localAssignment):
-            if len(localAssignment.getAssignment()) == csp.countVariables():        # if the assignment is complete and consistent, we can store it
+            if localAssignment.countAssigned() == csp.countVariables():        # if the assignment is complete and consistent, we can store it
                 if count:
                     solutions += 1
                 else:
@@ -0,0 +1,454 @@
+import csv
+import errno
+import json
+import os
+import sys
+from collections import deque
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from timeit import default_timer as timer
+
+try:
+    import resource
+except ImportError:     # not available on Windows: the memory of the jobs can't be limited
+    resource = None
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from Blocks import blockSolver
+from Corpus import *
+from Cutset import *
+from Instances import readDIMACS
+from MinConflicts import minConflicts
+from Stats import MemoryProfile
+from Trace import BinaryTraceWriter, ChromeTraceWriter
+from TreeDecomposition import treeDecompositionSolver
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+# every solver takes a csp and optional statistics, and returns the assignment and the size of the tree left by the cutset
+# (None if it isn't a cutset solver)
+SOLVERS: Dict[str, Callable[[CSP, Optional[SolverStats]], Tuple[Assignment, Optional[int]]]] = {
+    'backtrack': lambda csp, stats=None: (backtrack(csp, stats=stats), None),
+    'cutset': lambda csp, stats=None: cutset(csp, stats=stats),
+    'cutset-random': lambda csp, stats=None: cutset(csp, heuristic=False, stats=stats),
+    'blocks': lambda csp, stats=None: (blockSolver(csp, stats=stats), None),
+    'treedecomposition': lambda csp, stats=None: (treeDecompositionSolver(csp, stats=stats)[0], None),
+    'minconflicts': lambda csp, stats=None: (minConflicts(csp, seed=0, stats=stats), None),
+}
+
+# the solvers that send the search events to hooks
+TRACED_SOLVERS: Dict[str, Callable[[CSP, SearchHooks], Assignment]] = {
+    'backtrack': lambda csp, hooks: backtrack(csp, hooks=hooks),
+    'cutset': lambda csp, hooks: cutset(csp, hooks=hooks)[0],
+    'cutset-random': lambda csp, hooks: cutset(csp, heuristic=False, hooks=hooks)[0],
+}
+
+FIELDS = ['instance', 'n', 'seed', 'minimalCutsetSize', 'numColor', 'fast', 'solver', 'repeats', 'median', 'q1', 'q3', 'iqr', 'min', 'max', 'solved', 'valid', 'cutsetSize', 'peakRSS', 'status']
+
+
+def instances(sizes: Iterable[int], seeds: Iterable[int], *, minimalCutsetSize: int = 1, numColor: int = 4, corpus: Corpus = None,
+              fast: bool = False, files: Iterable[str] = ()) -> Iterator[Tuple[dict, tuple]]:
+    """
+    Gives the instances of a benchmark: the generated maps for every (size, seed), stored in the corpus, and then the DIMACS files.
+    Every instance comes with its source, a tuple that builder turns into a function that builds a new CSP
+    (so every run works on its own Variables); sources can be sent to other processes
+    :param sizes: numbers of regions
+    :param seeds: seeds of the maps
+    :param minimalCutsetSize: size of minimal cutset of the maps
+    :param numColor: number of colors
+    :param corpus: corpus of the maps; if None, the directory 'corpus' is used
+    :param fast: if True the maps are generated by generateMap's nearest-neighbour mode
+    :param files: paths of DIMACS .col files
+    :return: generator of (description of the instance, source)
+    """
+    if corpus is None:
+        corpus = Corpus()
+    seeds = list(seeds)
+    for n in sizes:
+        for seed in seeds:
+            corpus.getArrays(n, numColor=numColor, minimalCutsetSize=minimalCutsetSize, seed=seed, fast=fast)       # the map is generated once, here
+            yield {'instance': 'map', 'n': n, 'seed': seed, 'minimalCutsetSize': minimalCutsetSize, 'numColor': numColor, 'fast': fast}, \
+                ('map', corpus.getDirectory(), n, numColor, minimalCutsetSize, seed, fast)
+    for path in files:
+        n = readDIMACS(path, numColor=numColor).countVariables()
+        yield {'instance': os.path.basename(path), 'n': n, 'seed': None, 'minimalCutsetSize': None, 'numColor': numColor, 'fast': None}, ('dimacs', path, numColor)
+
+
+def builder(source: tuple, corpus: Corpus = None) -> Callable[[], CSP]:
+    """
+    :param source: source of an instance, given by instances
+    :param corpus: corpus of the maps; if None, a Corpus on the source's directory is used
+    :return: function that builds a new csp of the instance
+    :raise BenchmarkError: if the source isn't valid
+    """
+    if source[0] == 'map':
+        directory, n, numColor, minimalCutsetSize, seed, fast = source[1:]
+        if corpus is None:
+            corpus = Corpus(directory)
+        return corpus.get(n, numColor=numColor, minimalCutsetSize=minimalCutsetSize, seed=seed, fast=fast).toCSP
+    if source[0] == 'dimacs':
+        path, numColor = source[1:]
+        return lambda: readDIMACS(path, numColor=numColor)
+    raise BenchmarkError
+
+
+def _resetPeakRSS() -> None:
+    """
+    Resets the peak resident set size of the process, where the system allows it (Linux)
+    :return: None
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+
+def _peakRSS() -> Optional[float]:
+    """
+    :return: peak resident set size of the process since the last _resetPeakRSS (since its start where it can't be reset), in megabytes;
+        None if it can't be read
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss       # kilobytes, but bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+
+def measure(solver: str, build: Callable[[], CSP], *, repeats: int = 5, warmup: int = 1, stats: bool = False, profileMemory: bool = False) -> dict:
+    """
+    Times a solver on an instance: every run (warm-up ones too) solves a new CSP, and only the solver is timed
+    :param solver: name of the solver, a key of SOLVERS
+    :param build: function that builds a new csp of the instance
+    :param repeats: number of timed runs
+    :param warmup: number of runs before the timed ones
+    :param stats: if True, the solver's statistics are collected in one more run, after the timed ones, so they don't change the times
+    :param profileMemory: if True, the memory of the solver's phases is profiled with tracemalloc (see Stats.MemoryProfile) in one more run
+    :return: median, quartiles, interquartile range, min and max of the times (seconds), if the instance has been solved,
+        if the solution is valid, the mean size of the cutset (None if it isn't a cutset solver), the peak RSS of the process during
+        the runs (megabytes, the instance's building included), the statistics and the memory profile (if asked)
+    :raise BenchmarkError: if the solver doesn't exist or repeats isn't positive
+    """
+    if solver not in SOLVERS or repeats < 1:
+        raise BenchmarkError
+
+    times = []
+    cutsetSizes = []
+    solved = valid = True
+    _resetPeakRSS()
+    for run in range(warmup + repeats):
+        csp = build()
+        start = timer()
+        assignment, treeDimension = SOLVERS[solver](csp)
+        end = timer()
+        if run < warmup:
+            continue
+        times.append(end - start)
+        if treeDimension is not None:
+            cutsetSizes.append(csp.countVariables() - treeDimension)
+        if assignment.isNull():
+            solved = False
+        else:
+            for var in csp.getVariables():      # the solver has hidden some values: the solution is checked on the whole domains
+                var.resetDomain()
+            if not csp.verifyMany([assignment], complete=True)[0]:        # every run has its own csp, so the check can't batch the runs
+                valid = False
+
+    q1, median, q3 = np.percentile(times, [25, 50, 75])
+    result = {'solver': solver, 'repeats': repeats, 'median': median, 'q1': q1, 'q3': q3, 'iqr': q3 - q1, 'min': min(times), 'max': max(times),
+              'solved': solved, 'valid': valid if solved else None, 'cutsetSize': float(np.mean(cutsetSizes)) if len(cutsetSizes) != 0 else None,
+              'peakRSS': _peakRSS()}
+    if stats:
+        solverStats = SolverStats()
+        SOLVERS[solver](build(), solverStats)
+        result['stats'] = solverStats.toDict()
+    if profileMemory:
+        csp = build()
+        profile = MemoryProfile()
+        profile.start()
+        SOLVERS[solver](csp, SolverStats(profile))
+        profile.stop()
+        result['memory'] = profile.toDict()
+    return result
+
+
+def traceSolver(solver: str, build: Callable[[], CSP], path: str, *, binary: bool = False) -> Assignment:
+    """
+    Solves an instance writing the search events to a file, as they happen, so the search tree can be inspected offline
+    :param solver: name of the solver, a key of TRACED_SOLVERS
+    :param build: function that builds a new csp of the instance
+    :param path: path of the trace
+    :param binary: if True the trace is a binary log (see Trace.readBinaryTrace), otherwise Chrome trace-event JSON
+    :return: the assignment found by the solver
+    :raise BenchmarkError: if the solver doesn't send events
+    """
+    if solver not in TRACED_SOLVERS:
+        raise BenchmarkError
+    csp = build()
+    with open(path, 'wb' if binary else 'w') as file:
+        hooks = BinaryTraceWriter(file) if binary else ChromeTraceWriter(file)
+        assignment = TRACED_SOLVERS[solver](csp, hooks)
+        hooks.close()
+    return assignment
+
+
+def runBenchmark(solvers: Iterable[str], sizes: Iterable[int], seeds: Iterable[int], *, minimalCutsetSize: int = 1, numColor: int = 4,
+                 repeats: int = 5, warmup: int = 1, corpus: Corpus = None, fast: bool = False, files: Iterable[str] = (),
+                 stats: bool = False, profileMemory: bool = False, verbose: bool = True) -> List[dict]:
+    """
+    Runs every solver on every instance (see instances and measure)
+    :param solvers: names of the solvers, keys of SOLVERS
+    :param sizes: numbers of regions of the maps
+    :param seeds: seeds of the maps
+    :param minimalCutsetSize: size of minimal cutset of the maps
+    :param numColor: number of colors
+    :param repeats: number of timed runs
+    :param warmup: number of runs before the timed ones
+    :param corpus: corpus of the maps; if None, the directory 'corpus' is used
+    :param fast: if True the maps are generated by generateMap's nearest-neighbour mode
+    :param files: paths of DIMACS .col files
+    :param stats: if True, the solvers' statistics are collected too (see measure)
+    :param profileMemory: if True, the memory of the solvers' phases is profiled too (see measure)
+    :param verbose: if True every result is printed
+    :return: a dict (with the keys in FIELDS) for every (instance, solver)
+    :raise BenchmarkError: if a solver doesn't exist
+    """
+    solvers = list(solvers)
+    if any(solver not in SOLVERS for solver in solvers):
+        raise BenchmarkError
+
+    results = []
+    if corpus is None:
+        corpus = Corpus()
+    for description, source in instances(sizes, seeds, minimalCutsetSize=minimalCutsetSize, numColor=numColor, corpus=corpus, fast=fast, files=files):
+        build = builder(source, corpus)
+        for solver in solvers:
+            result = dict(description)
+            result.update(measure(solver, build, repeats=repeats, warmup=warmup, stats=stats, profileMemory=profileMemory))
+            result['status'] = 'ok'
+            results.append(result)
+            if verbose:
+                _print(result)
+    return results
+
+
+def _print(result: dict) -> None:
+    """
+    Prints a result on a single line
+    :param result: result of a job
+    :return: None
+    """
+    if result['status'] == 'ok':
+        print(result['instance'], result['n'], result['seed'], result['solver'], '%.6f' % result['median'], '(IQR %.6f)' % result['iqr'],
+              'solved' if result['solved'] else 'unsatisfiable', '' if result.get('peakRSS') is None else '%.1f MB' % result['peakRSS'])
+    else:
+        print(result['instance'], result['n'], result['seed'], result['solver'], result['status'])
+
+
+def _worker(connection, source: tuple, solver: str, repeats: int, warmup: int, stats: bool, profileMemory: bool, cpu: Optional[int],
+            memory: Optional[int]) -> None:
+    """
+    Runs a single job in its own process: the process is pinned to a cpu and its address space is limited, then the result is sent back
+    :param connection: end of the pipe to the main process
+    :param source: source of the instance
+    :param solver: name of the solver
+    :param repeats: number of timed runs
+    :param warmup: number of runs before the timed ones
+    :param stats: if True, the solver's statistics are collected too
+    :param profileMemory: if True, the memory of the solver's phases is profiled too
+    :param cpu: cpu of the process; if None, the process isn't pinned
+    :param memory: maximum size of the address space, in bytes; if None, it isn't limited
+    :return: None
+    """
+    if cpu is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {cpu})
+    if memory is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    try:
+        result = measure(solver, builder(source), repeats=repeats, warmup=warmup, stats=stats, profileMemory=profileMemory)
+        result['status'] = 'ok'
+    except MemoryError:
+        result = {'status': 'memory'}
+    except OSError as exception:
+        result = {'status': 'memory' if exception.errno == errno.ENOMEM else 'error', 'error': repr(exception)}     # e.g. a memory map over the limit
+    except Exception as exception:
+        result = {'status': 'error', 'error': repr(exception)}
+    connection.send(result)
+    connection.close()
+
+
+# every parameter of a job that changes its result
+_JOB_FIELDS = ['instance', 'n', 'seed', 'minimalCutsetSize', 'numColor', 'fast', 'solver', 'repeats', 'warmup', 'collectStats', 'profileMemory']
+
+
+def _key(job: dict) -> str:
+    """
+    :param job: result of a job, or its description with the solver and the run's parameters
+    :return: key of a job, to recognize it in the results already on disk (a result written by an older version has no key in common)
+    """
+    return json.dumps([job.get(field) for field in _JOB_FIELDS])
+
+
+def runParallel(solvers: Iterable[str], sizes: Iterable[int], seeds: Iterable[int], *, minimalCutsetSize: int = 1, numColor: int = 4,
+                repeats: int = 5, warmup: int = 1, corpus: Corpus = None, fast: bool = False, files: Iterable[str] = (),
+                stats: bool = False, profileMemory: bool = False, processes: int = None, timeout: float = None, memory: int = None, pin: bool = True,
+                output: str = 'results.jsonl', verbose: bool = True) -> List[dict]:
+    """
+    Runs every solver on every instance like runBenchmark, but every (instance, solver) job runs in its own process,
+    with at most processes jobs at the same time. A job that exceeds its time or memory is stopped and recorded with status
+    'timeout' or 'memory' (or 'error' if it fails). Every result is appended to the output file (a JSON object per line) as soon as
+    the job ends: running again with the same output file, the jobs already there (with the same parameters) are skipped, so an interrupted run goes on from where it stopped
+    :param solvers: names of the solvers, keys of SOLVERS
+    :param sizes: numbers of regions of the maps
+    :param seeds: seeds of the maps
+    :param minimalCutsetSize: size of minimal cutset of the maps
+    :param numColor: number of colors
+    :param repeats: number of timed runs
+    :param warmup: number of runs before the timed ones
+    :param corpus: corpus of the maps; if None, the directory 'corpus' is used
+    :param fast: if True the maps are generated by generateMap's nearest-neighbour mode
+    :param files: paths of DIMACS .col files
+    :param stats: if True, the solvers' statistics are collected too (see measure)
+    :param profileMemory: if True, the memory of the solvers' phases is profiled too (see measure)
+    :param processes: maximum number of jobs at the same time; if None, the number of available cpus
+    :param timeout: maximum time of a job (warm-up and timed runs), in seconds; if None, it isn't limited
+    :param memory: maximum memory of a job, in bytes; if None, it isn't limited
+    :param pin: if True every process is pinned to its own cpu, to reduce the noise of the times
+    :param output: path of the results' file
+    :param verbose: if True every result is printed
+    :return: a dict (with the keys in FIELDS) for every (instance, solver), including the ones found in the output file
+    :raise BenchmarkError: if a solver doesn't exist
+    """
+    solvers = list(solvers)
+    if any(solver not in SOLVERS for solver in solvers):
+        raise BenchmarkError
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    if processes is None:
+        processes = len(cpus)
+
+    done: Dict[str, dict] = {}
+    if os.path.exists(output):
+        with open(output) as file:
+            for line in file:
+                try:
+                    result = json.loads(line)
+                except ValueError:      # the last line can be truncated if the run was interrupted
+                    continue
+                done[_key(result)] = result
+
+    keys = []
+    pending = deque()
+    for description, source in instances(sizes, seeds, minimalCutsetSize=minimalCutsetSize, numColor=numColor, corpus=corpus, fast=fast, files=files):
+        for solver in solvers:
+            job = dict(description, solver=solver, repeats=repeats, warmup=warmup, collectStats=stats, profileMemory=profileMemory)
+            keys.append(_key(job))
+            if keys[-1] not in done:
+                pending.append((keys[-1], job, source, solver))
+
+    running = {}        # process' sentinel -> (process, pipe, job, slot, deadline)
+    slots = list(range(processes))
+    with open(output, 'a') as stream:
+        while len(pending) != 0 or len(running) != 0:
+            while len(pending) != 0 and len(slots) != 0:
+                job = pending.popleft()
+                slot = slots.pop()
+                receiver, sender = Pipe(duplex=False)
+                process = Process(target=_worker, args=(sender, job[2], job[3], repeats, warmup, stats, profileMemory, cpus[slot % len(cpus)] if pin else None, memory))
+                process.start()
+                sender.close()
+                running[process.sentinel] = (process, receiver, job, slot, None if timeout is None else timer() + timeout)
+
+            deadlines = [entry[4] for entry in running.values() if entry[4] is not None]
+            ended = wait(list(running), None if len(deadlines) == 0 else max(0.0, min(deadlines) - timer()))
+            now = timer()
+            for sentinel in list(running):
+                process, receiver, job, slot, deadline = running[sentinel]
+                if sentinel in ended:
+                    received = receiver.recv() if receiver.poll() else {'status': 'memory' if process.exitcode == -9 else 'error'}     # -9: killed, as by the OOM killer
+                elif deadline is not None and now >= deadline:
+                    process.kill()
+                    received = {'status': 'timeout'}
+                else:
+                    continue
+                process.join()
+                receiver.close()
+                del running[sentinel]
+                slots.append(slot)
+
+                key, row, source, solver = job
+                result = dict(row)
+                result.update(received)
+                done[key] = result
+                stream.write(json.dumps(result) + '\n')
+                stream.flush()
+                if verbose:
+                    _print(result)
+    return [done[key] for key in keys]
+
+
+def writeJSON(results: List[dict], path: str) -> None:
+    """
+    :param results: results of runBenchmark
+    :param path: path of the JSON file
+    :return: None
+    """
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=1)
+
+
+def writeCSV(results: List[dict], path: str) -> None:
+    """
+    :param results: results of runBenchmark
+    :param path: path of the CSV file
+    :return: None
+    """
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow({field: result.get(field) for field in FIELDS})
+
+
+def plotResults(path: str, directory: str = '.') -> None:
+    """
+    Plots, offline, the results of a benchmark saved in a JSON file: median solving time and cutset size of every solver
+    by number of variables (averaged on the seeds). The plots are saved as PNG files, nothing is shown
+    :param path: path of the JSON file written by writeJSON
+    :param directory: directory of the images
+    :return: None
+    """
+    with open(path) as file:
+        results = [result for result in json.load(file) if result['instance'] == 'map']
+
+    for field, title, label, name in (('median', 'Tempo di risoluzione', 'Tempo (secondi)', 'time.png'),
+                                      ('cutsetSize', 'Dimensione cutset effettivo', 'Numero di variabili', 'cutset.png')):
+        plt.figure()
+        legend = []
+        for solver in sorted({result['solver'] for result in results}):
+            points: Dict[int, List[float]] = {}
+            for result in results:
+                if result['solver'] == solver and result.get(field) is not None:
+                    points.setdefault(result['n'], []).append(result[field])
+            if len(points) != 0:
+                x = sorted(points)
+                plt.plot(x, [np.mean(points[n]) for n in x])
+                legend.append(solver)
+        plt.legend(legend)
+        plt.title(title)
+        plt.xlabel('Numero di variabili')
+        plt.ylabel(label)
+        plt.savefig(os.path.join(directory, name))
+        plt.close()
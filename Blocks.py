@@ -0,0 +1,158 @@
+from Cutset import *
+
+
+def biconnectedComponents(csp: CSP) -> Tuple[List[Set[Variable]], Set[Variable]]:
+    """
+    Given a csp, it splits its constraint graph in biconnected blocks using Tarjan's algorithm (with an iterative DFS).
+    Every cycle of the graph lies inside a single block, two blocks share at most one variable and the shared ones are the articulation points
+    Execution time: O(n+e) e=number of constraints
+    :param csp: csp of interest
+    :return: list of blocks and set of articulation points
+    """
+    index: Dict[Variable, int] = {}
+    low: Dict[Variable, int] = {}
+    blocks = []
+    for start in csp.getVariables():
+        if start in index:
+            continue
+        index[start] = low[start] = len(index)
+        if len(csp.getBinaryConstraintsForVar(start)) == 0:     # an isolated variable is a block by itself
+            blocks.append({start})
+            continue
+
+        stack = [(start, None, iter(csp.getBinaryConstraintsForVar(start)))]
+        edges = []
+        while len(stack) != 0:
+            var, parent, neighbours = stack[-1]
+            for var2 in neighbours:
+                if var2 is var:
+                    continue
+                if var2 not in index:       # tree edge: we go down...
+                    index[var2] = low[var2] = len(index)
+                    edges.append((var, var2))
+                    stack.append((var2, var, iter(csp.getBinaryConstraintsForVar(var2))))
+                    break
+                elif var2 is not parent and index[var2] < index[var]:       # back edge
+                    edges.append((var, var2))
+                    low[var] = min(low[var], index[var2])
+            else:       # ... every neighbour has been visited: we go back up
+                stack.pop()
+                if len(stack) != 0:
+                    parent = stack[-1][0]
+                    low[parent] = min(low[parent], low[var])
+                    if low[var] >= index[parent]:       # parent separates var's subtree: its edges form a block
+                        block = set()
+                        while True:
+                            edge = edges.pop()
+                            block.add(edge[0])
+                            block.add(edge[1])
+                            if edge[0] is parent and edge[1] is var:
+                                break
+                        blocks.append(block)
+
+    count: Dict[Variable, int] = {}
+    for block in blocks:
+        for var in block:
+            count[var] = count.get(var, 0) + 1
+    return blocks, {var for var in count if count[var] > 1}
+
+
+def blockSolver(csp: CSP, *, useCutset: bool = True, heuristic: bool = True, stats: SolverStats = None) -> Assignment:
+    """
+    Given a csp, find a possible assignment solving every biconnected block on its own, with cutset or backtrack.
+    Blocks are visited on the block-cut tree: from the leaves to the roots, every block keeps in its parent articulation variable's domain
+    only the values for which it has a solution (directional consistency); then from the roots every block takes the solution
+    matching the value chosen for its parent articulation variable
+    :param csp: csp of interest
+    :param useCutset: if True every block is solved by cutset, if False by backtrack
+    :param heuristic: if True cutset's variables' order is chosen by MRV-HD, if False is chosen randomly
+    :param stats: statistics to update, summed over every block's solve; if None, nothing is counted
+    :return: assignment that satisfies the csp, eventually null if it is unsatisfiable
+    """
+    def solveBlock(block_i: Set[Variable], restricted: Dict[Variable, Set]) -> Optional[Dict[Variable, Any]]:
+        """
+        Solves the csp induced by a block on copies of its variables, so the original domains are never touched
+        :param block_i: variables of the block
+        :param restricted: domains to use instead of the actual ones
+        :return: values of the block's variables if a solution exists, None otherwise
+        """
+        sub = CSP()
+        copies: Dict[Variable, Variable] = {}
+        for var_i in block_i:
+            copies[var_i] = Variable(var_i.getName(), restricted.get(var_i, var_i.getActualDomain()))
+            sub.addVariable(copies[var_i])
+            unaryConstraints = csp.getUnaryConstraintsForVar(var_i)
+            for value_i in unaryConstraints:
+                sub.addUnaryConstraint(copies[var_i], unaryConstraints[value_i][0], value_i)
+        for var_i in block_i:
+            binaryConstraints = csp.getBinaryConstraintsForVar(var_i)
+            for var2, constraint in binaryConstraints.items():
+                if var2 in block_i and var2 is not var_i:
+                    sub.addBinaryConstraint(copies[var_i], constraint, copies[var2])
+
+        if useCutset:
+            subAssignment = cutset(sub, heuristic=heuristic, stats=stats)[0]
+        else:
+            subAssignment = backtrack(sub, stats=stats)
+        if subAssignment.isNull():
+            return None
+        subValues = subAssignment.getAssignment()
+        return {var_i: subValues[copies[var_i]] for var_i in block_i}
+
+    def nullAssignment() -> Assignment:
+        null = Assignment()
+        null.setNull()
+        return null
+
+    blocks, articulations = biconnectedComponents(csp)
+    blocksOf: Dict[Variable, List[int]] = {}
+    for b in range(len(blocks)):
+        for var in blocks[b] & articulations:
+            blocksOf.setdefault(var, []).append(b)
+
+    order = []      # blocks in breadth-first order on the block-cut tree, with the articulation variable shared with the parent
+    visited = set()
+    for root in range(len(blocks)):
+        if root in visited:
+            continue
+        visited.add(root)
+        order.append((root, None))
+        k = len(order) - 1
+        while k < len(order):
+            b = order[k][0]
+            for var in blocks[b] & articulations:
+                for child in blocksOf[var]:
+                    if child not in visited:
+                        visited.add(child)
+                        order.append((child, var))
+            k += 1
+
+    supported: Dict[Variable, Set] = {}     # values of the articulation variables that every child block can extend
+    solutions: Dict[Tuple[int, Any], Dict[Variable, Any]] = {}
+    for b, parentVar in reversed(order):
+        restricted = {var: supported[var] for var in blocks[b] & supported.keys() if var is not parentVar}
+        if parentVar is None:
+            solution = solveBlock(blocks[b], restricted)
+            if solution is None:
+                return nullAssignment()
+            solutions[(b, None)] = solution
+            continue
+        values = set()
+        for value in supported.get(parentVar, parentVar.getActualDomain()):
+            restricted[parentVar] = {value}
+            solution = solveBlock(blocks[b], restricted)
+            if solution is not None:
+                values.add(value)
+                solutions[(b, value)] = solution
+        supported[parentVar] = supported.get(parentVar, parentVar.getActualDomain()) & values
+        if len(supported[parentVar]) == 0:
+            return nullAssignment()
+
+    values: Dict[Variable, Any] = {}
+    for b, parentVar in order:
+        values.update(solutions[(b, None if parentVar is None else values[parentVar])])
+
+    assignment = Assignment()
+    for var in values:
+        assignment.addVarAssigned(var, values[var])
+    return assignment
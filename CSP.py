@@ -1,17 +1,205 @@
 from __future__ import annotations
 
-from typing import Set, Optional, List, Dict, Any
+from typing import Set, Optional, List, Dict, Any, Iterable, Iterator, Sequence, Tuple
+from collections.abc import Mapping, Set as AbstractSet
+from array import array
+from bisect import bisect_left
+from types import MappingProxyType
 from copy import copy
+from ast import literal_eval
+import struct
+
+import numpy as np
 
 from Variable import Variable
 from Constraints import *
-from Assignment import Assignment
+from Assignment import Assignment, PersistentAssignment
 
 
 class CSPError(Exception):
     pass
 
 
+# layout of the binary file written by CSP.save: a header (magic, version, number of sections) followed by the table
+# of the sections' offsets and lengths, then the sections, in this order and 8-byte aligned
+_FILE_MAGIC = b'CSPBIN\x00\x00'
+_FILE_VERSION = 1
+_FILE_SECTIONS = [
+    ('names', '<u1'),               # variables' names, utf-8
+    ('nameOffsets', '<i8'),         # n+1 offsets in names
+    ('values', '<u1'),              # domain value table, every value as a Python literal, utf-8
+    ('valueOffsets', '<i8'),        # d+1 offsets in values
+    ('domainOffsets', '<i8'),       # n+1 offsets in domainValues
+    ('domainValues', '<i4'),        # values (indexes of the value table) of every variable's initial domain
+    ('hidden', '<u1'),              # 1 if the corresponding domain value is hidden
+    ('edges', '<i4'),               # (m, 2) variables' indexes, every binary constraint once
+    ('edgeConstraints', '<u1'),     # constraint ID of every edge, as stored from the first to the second variable
+    ('unary', '<i4'),               # (u, 2) variable's index and value's index
+    ('unaryConstraints', '<u1'),    # constraint ID of every unary constraint
+]
+_FILE_CONSTRAINTS = [equals, different, greater, greaterOrEqual, lesser, lesserOrEqual]     # constraint ID = 2 * index + dual
+
+
+class _Arcs(AbstractSet):
+    """
+    Read-only set of arcs, computed from the compact storage of the CSP while it is iterated; set operations (|, &, -) return new sets
+    """
+    __slots__ = ()
+
+    @classmethod
+    def _from_iterable(cls, iterable: Iterable) -> set:
+        return set(iterable)
+
+    def copy(self) -> set:
+        return set(self)
+
+    def union(self, *others: Iterable) -> set:
+        return set(self).union(*others)
+
+
+class _Adjacency(Mapping):
+    """
+    This class represent the binary constraints of a variable, stored as two arrays: the IDs of the neighbours, kept sorted so a
+    neighbour is found by binary search, and the codes of the constraints from the variable to them (see CSP._code).
+    It is also a read-only dict-like view neighbour -> constraint
+    """
+    __slots__ = ('_csp', '_var', 'neighbours', 'constraints', '_arcs')
+
+    def __init__(self, csp: CSP, var: Variable):
+        self._csp = csp
+        self._var = var
+        self.neighbours = array('i')
+        self.constraints = array('i')
+        self._arcs: Optional[_NeighbourArcs] = None
+
+    def find(self, var: Variable) -> int:
+        """
+        :return: position of a neighbour in the arrays, -1 if it isn't a neighbour
+        """
+        i = self._csp._ids.get(var)
+        if i is None:
+            return -1
+        return self.position(i)
+
+    def position(self, i: int) -> int:
+        """
+        Execution time: O(log g) g=number of neighbours
+        :param i: ID of a variable
+        :return: position of the neighbour in the arrays, -1 if it isn't a neighbour
+        """
+        k = bisect_left(self.neighbours, i)
+        if k < len(self.neighbours) and self.neighbours[k] == i:
+            return k
+        return -1
+
+    def insert(self, i: int, code: int) -> None:
+        """
+        Adds a neighbour, keeping the arrays sorted
+        :param i: ID of the neighbour
+        :param code: code of the constraint from the variable to it
+        """
+        k = bisect_left(self.neighbours, i)
+        self.neighbours.insert(k, i)
+        self.constraints.insert(k, code)
+
+    def remove(self, i: int) -> None:
+        """
+        Removes a neighbour
+        :param i: ID of the neighbour
+        """
+        k = self.position(i)
+        del self.neighbours[k]
+        del self.constraints[k]
+
+    def __getitem__(self, var: Variable) -> Constraint:
+        position = self.find(var)
+        if position < 0:
+            raise KeyError(var)
+        return self._csp._constraints[self.constraints[position]]
+
+    def __contains__(self, var) -> bool:
+        return self.find(var) >= 0
+
+    def __iter__(self) -> Iterator[Variable]:
+        variables = self._csp._byID
+        for i in self.neighbours:
+            yield variables[i]
+
+    def __len__(self) -> int:
+        return len(self.neighbours)
+
+    def items(self) -> Iterator[Tuple[Variable, Constraint]]:
+        variables = self._csp._byID
+        constraints = self._csp._constraints
+        for i, code in zip(self.neighbours, self.constraints):
+            yield variables[i], constraints[code]
+
+    def arcs(self) -> _NeighbourArcs:
+        """
+        :return: the arcs between the variable and its neighbours, in both directions
+        """
+        if self._arcs is None:
+            self._arcs = _NeighbourArcs(self)
+        return self._arcs
+
+
+class _NeighbourArcs(_Arcs):
+    """
+    Arcs (var, neighbour) and (neighbour, var) of a variable
+    """
+    __slots__ = ('_adjacency',)
+
+    def __init__(self, adjacency: _Adjacency):
+        self._adjacency = adjacency
+
+    def __iter__(self) -> Iterator[tuple]:
+        var = self._adjacency._var
+        for other in self._adjacency:
+            yield var, other
+            if other is not var:
+                yield other, var
+
+    def __len__(self) -> int:
+        selfLoop = self._adjacency.position(self._adjacency._csp._ids[self._adjacency._var]) >= 0
+        return 2 * len(self._adjacency.neighbours) - selfLoop
+
+    def __contains__(self, arc) -> bool:
+        if not isinstance(arc, tuple) or len(arc) != 2:
+            return False
+        var = self._adjacency._var
+        if arc[0] is var:
+            return arc[1] in self._adjacency
+        return arc[1] is var and arc[0] in self._adjacency
+
+
+class _EdgesArcs(_Arcs):
+    """
+    Arcs of every binary constraint of a csp, in both directions
+    """
+    __slots__ = ('_csp',)
+
+    def __init__(self, csp: CSP):
+        self._csp = csp
+
+    def __iter__(self) -> Iterator[tuple]:
+        variables = self._csp._byID
+        for adjacency in self._csp._binaryConstraints:
+            if adjacency is not None:
+                var = adjacency._var
+                for i in adjacency.neighbours:
+                    yield var, variables[i]
+
+    def __len__(self) -> int:
+        return self._csp._arcCount
+
+    def __contains__(self, arc) -> bool:
+        return isinstance(arc, tuple) and len(arc) == 2 and self._csp.findBinaryCostraint(arc[0], arc[1]) is not None
+
+
+_NO_ARCS = frozenset()
+_NO_CONSTRAINTS = MappingProxyType({})
+
+
 class CSP:
     """
     This class represent a Constraint Satisfaction Problem that can include unary and binary constraint.
@@ -21,7 +209,15 @@ class CSP:
     def __init__(self):
         self._variables = set()
         self._unaryConstraints: Dict[Variable, Dict[Any, List[Constraint]]] = {}
-        self._binaryConstraints: Dict[Variable, Dict[Variable, List[Constraint]]] = {}
+        self._ids: Dict[Variable, int] = {}         # ID of every variable ever added, index of _byID and _binaryConstraints
+        self._byID: List[Variable] = []
+        self._binaryConstraints: List[Optional[_Adjacency]] = []        # by variable ID; None if the variable has no binary constraint or it has been removed
+        self._constraints: List[Constraint] = []        # constraints used by the csp, by code
+        self._codes: Dict[Constraint, int] = {}
+        self._duals: List[int] = []         # code of the dual of every code
+        self._arcCount = 0
+        self._edges = _EdgesArcs(self)
+        self._trail: List[tuple] = []       # undo stack of the changes made by adapt
 
     def __copy__(self):
         return self.subproblem(Assignment())
@@ -37,6 +233,10 @@ class CSP:
             raise CSPError
 
         self._variables.add(var)
+        if var not in self._ids:
+            self._ids[var] = len(self._byID)
+            self._byID.append(var)
+            self._binaryConstraints.append(None)
 
     def getVariable(self, name: str) -> Variable:
         """
@@ -84,6 +284,42 @@ class CSP:
         else:
             raise CSPError
 
+    def _code(self, constraint: Constraint) -> int:
+        """
+        :param constraint: constraint used by the csp
+        :return: its code; a new constraint gets two consecutive codes, for it and its dual
+        """
+        code = self._codes.get(constraint)
+        if code is None:
+            code = len(self._constraints)
+            dual = constraint.getDual()
+            self._constraints.extend((constraint, dual))
+            self._codes[constraint] = code
+            self._codes[dual] = code + 1
+            self._duals.extend((code + 1, code))
+        return code
+
+    def _adjacency(self, var: Variable) -> Optional[_Adjacency]:
+        """
+        :return: the binary constraints of a variable, None if it has none
+        """
+        i = self._ids.get(var)
+        return None if i is None else self._binaryConstraints[i]
+
+    def _link(self, variable1: Variable, variable2: Variable, code: int) -> None:
+        """
+        Stores a new binary constraint, from variable1 to variable2, and its dual
+        :param code: code of the constraint
+        """
+        for var, other, c in ((variable1, variable2, code), (variable2, variable1, self._duals[code])):
+            i = self._ids[var]
+            if self._binaryConstraints[i] is None:
+                self._binaryConstraints[i] = _Adjacency(self, var)
+            self._binaryConstraints[i].insert(self._ids[other], c)
+            self._arcCount += 1
+            if variable1 is variable2:      # a self-loop is stored once
+                break
+
     def addBinaryConstraint(self, variable1: Variable, constraint: Constraint, variable2: Variable, *, override: bool = False) -> None:
         """
         Adds a binary constraint to the CSP. The order of the variable is important!
@@ -100,24 +336,34 @@ class CSP:
             raise CSPError
 
         if variable1 in self._variables and variable2 in self._variables:
-            if variable1 not in self._binaryConstraints:
-                self._binaryConstraints[variable1] = {}
-            if variable2 not in self._binaryConstraints:
-                self._binaryConstraints[variable2] = {}
-            if variable2 not in self._binaryConstraints[variable1]:
-                self._binaryConstraints[variable1][variable2] = []
-                self._binaryConstraints[variable2][variable1] = []
-            else:
-                if not override:
-                    return
-                else:
-                    self._binaryConstraints[variable1][variable2].clear()   # if already exists a constraint between them, delete it
-                    self._binaryConstraints[variable2][variable1].clear()
-            self._binaryConstraints[variable1][variable2].append(constraint)
-            self._binaryConstraints[variable2][variable1].append(constraint.getDual())
+            adjacency = self._adjacency(variable1)
+            position = -1 if adjacency is None else adjacency.find(variable2)
+            if position < 0:
+                self._link(variable1, variable2, self._code(constraint))
+            elif override:      # if already exists a constraint between them, replace it
+                code = self._code(constraint)
+                adjacency.constraints[position] = code
+                if variable2 is not variable1:
+                    other = self._adjacency(variable2)
+                    other.constraints[other.find(variable1)] = self._duals[code]
         else:
             raise CSPError
 
+    def addBinaryConstraints(self, constraints: Iterable[Tuple[Variable, Constraint, Variable]]) -> None:
+        """
+        Adds many binary constraints, consuming them one at a time from any iterable (e.g. a generator reading a file).
+        It works like addBinaryConstraint without override
+        :param constraints: triples (first variable, constraint, second variable)
+        :return: None
+        :raise CSPError: if a constraint isn't a Constraint and if a variable doesn't exist in CSP's variables
+        """
+        for variable1, constraint, variable2 in constraints:
+            if variable1 not in self._variables or variable2 not in self._variables or not isinstance(constraint, Constraint):
+                raise CSPError
+            adjacency = self._adjacency(variable1)
+            if adjacency is None or adjacency.find(variable2) < 0:
+                self._link(variable1, variable2, self._code(constraint))
+
     def addAllDifferent(self) -> None:
         """
         Adds the different constraint between every couple of variables
@@ -128,18 +374,16 @@ class CSP:
                 if v1 is not v2:
                     self.addBinaryConstraint(v1, different, v2)
 
-    def getBinaryConstraintsForVar(self, var: Variable) -> Dict[Variable, List[Constraint]]:
+    def getBinaryConstraintsForVar(self, var: Variable) -> Mapping[Variable, Constraint]:
         """
         Returns all binary constraints that involve a variable
         :param var: variable to look for
-        :return: dict for constraints
+        :return: read-only dict-like view neighbour -> constraint (from var to the neighbour)
         :raise CSPError: if var param isn't a Variable
         """
         if var in self._variables:
-            if var in self._binaryConstraints:
-                return self._binaryConstraints[var]
-            else:
-                return {}
+            adjacency = self._binaryConstraints[self._ids[var]]
+            return _NO_CONSTRAINTS if adjacency is None else adjacency
         else:
             raise CSPError
 
@@ -165,10 +409,16 @@ class CSP:
         :param var2:
         :return: constraint if it exists or None otherwise
         """
-        if var1 in self._binaryConstraints and var2 in self._binaryConstraints[var1]:
-            return self._binaryConstraints[var1][var2][0]
-        else:
+        i = self._ids.get(var1)
+        j = self._ids.get(var2)
+        if i is None or j is None or self._binaryConstraints[i] is None:
             return None
+        adjacency = self._binaryConstraints[i]
+        neighbours = adjacency.neighbours
+        k = bisect_left(neighbours, j)      # as adjacency.position, inlined: it's called for every arc revised
+        if k < len(neighbours) and neighbours[k] == j:
+            return self._constraints[adjacency.constraints[k]]
+        return None
 
     def findUnaryConstraint(self, var: Variable, value) -> Optional[Constraint]:
         """
@@ -184,9 +434,9 @@ class CSP:
 
     def getBinaryConstraints(self) -> dict:
         """
-        :return: defensive copy of binary constraints
+        :return: dict with the binary constraints of every variable that has some (each one a read-only dict-like view)
         """
-        return self._binaryConstraints.copy()
+        return {adjacency._var: adjacency for adjacency in self._binaryConstraints if adjacency is not None}
 
     def getUnaryConstraints(self) -> dict:
         """
@@ -194,29 +444,25 @@ class CSP:
         """
         return self._unaryConstraints.copy()
 
-    def getEdges(self) -> Set[tuple]:
+    def getEdges(self) -> AbstractSet[tuple]:
         """
-        Returns all tuples representing a constraint between two variables, including dual constraints
-        :return: set of tuple
+        Returns all tuples representing a constraint between two variables, including dual constraints.
+        The set isn't built: it is a view on the constraints, so this costs O(1)
+        :return: read-only view of the set of tuple (copy it to change it)
         """
-        edges = set()
-        for var1 in self._binaryConstraints:
-            for var2 in self._binaryConstraints[var1]:
-                edges.add((var1, var2))
-        return edges
+        return self._edges
 
-    def getNeighbour(self, var: Variable) -> Set[tuple]:
+    def getNeighbour(self, var: Variable) -> AbstractSet[tuple]:
         """
-        Returns all tuples representing a constraint between a variable and its neighbours
+        Returns all tuples representing a constraint between a variable and its neighbours, in both directions.
+        The set isn't built: it is a view on the constraints, so this costs O(1)
         :param var: variable to search for neighbour
-        :return: set of tuple
+        :return: read-only view of the set of tuple (copy it to change it)
         """
-        edges = set()
-        if var in self._binaryConstraints:
-            for var2 in self._binaryConstraints[var]:
-                edges.add((var, var2))
-                edges.add((var2, var))
-        return edges
+        adjacency = self._adjacency(var)
+        if adjacency is None:
+            return _NO_ARCS
+        return adjacency.arcs()
 
     def countVariables(self) -> int:
         """
@@ -230,21 +476,23 @@ class CSP:
         :param assignment: assignment to check for consistency
         :return: True if it is consistent, False otherwise
         """
-        assignment = assignment.getAssignment()
-        for var in assignment:
-            assignedValue = assignment[var]
+        values = assignment.getAssignment()
+        for var, assignedValue in values.items():
             if assignedValue not in var.getActualDomain():
                 return False
             if var in self._unaryConstraints:
                 for value in self._unaryConstraints[var]:
                     if not self._unaryConstraints[var][value][0](assignedValue, value):
                         return False
-            if var in self._binaryConstraints:
-                for var2 in assignment:
-                    if var2 is not var:
-                        if var2 in self._binaryConstraints[var]:
-                            if not self._binaryConstraints[var][var2][0](assignedValue, assignment[var2]):
-                                return False
+            i = self._ids.get(var)
+            adjacency = self._binaryConstraints[i] if i is not None else None
+            if adjacency is not None:
+                for j, code in zip(adjacency.neighbours, adjacency.constraints):        # only the neighbours, every constraint once
+                    if j <= i:
+                        continue
+                    var2 = self._byID[j]
+                    if var2 in values and not self._constraints[code](assignedValue, values[var2]):
+                        return False
         return True
 
     def assignmentConsistencyForVar(self, assignment: Assignment, var: Variable) -> bool:
@@ -254,22 +502,102 @@ class CSP:
         :param var: var to check for assignment
         :return: True if it is consistent, False otherwise
         """
-        assignment = assignment.getAssignment()
-        assignedValue = assignment[var]
+        assignedValue = assignment.getValue(var)
         if assignedValue not in var.getActualDomain():
             return False
         if var in self._unaryConstraints:
             for value in self._unaryConstraints[var]:
                 if not self._unaryConstraints[var][value][0](assignedValue, value):
                     return False
-        if var in self._binaryConstraints:
-            for var2 in assignment:
-                if var2 is not var:
-                    if var2 in self._binaryConstraints[var]:
-                        if not self._binaryConstraints[var][var2][0](assignedValue, assignment[var2]):
-                            return False
+        adjacency = self._adjacency(var)
+        if adjacency is not None:
+            for j, code in zip(adjacency.neighbours, adjacency.constraints):        # only the neighbours
+                var2 = self._byID[j]
+                if var2 is not var and assignment.isAssigned(var2) and not self._constraints[code](assignedValue, assignment.getValue(var2)):
+                    return False
         return True
 
+    def verifyMany(self, solutions: Iterable[Assignment], complete: bool = False) -> np.ndarray:
+        """
+        Check the consistency of many assignments at once. Every variable's values are numbered, the unary constraints and the
+        actual domains are compiled to a boolean matrix variable x value and every group of binary constraints with the same
+        constraint and domains to a boolean matrix value x value; then each constraint is checked on all the assignments by numpy indexing
+        Execution time: O(ed^2 + k(n + e)) k=number of assignments, with the O(k(n + e)) part vectorized
+        :param solutions: assignments to check
+        :param complete: if True, an assignment must also assign every variable of the csp
+        :return: boolean array, True for every consistent assignment (a null assignment never is)
+        """
+        solutions = list(solutions)
+        variables = self._byID
+        size = len(variables)
+        tables: Dict[frozenset, Tuple[List[Any], Dict[Any, int]]] = {}     # variables with the same domain share the numbering
+        numbering: List[Tuple[List[Any], Dict[Any, int]]] = []
+        for var in variables:
+            domain = var.getInitialDomain()
+            key = frozenset(domain)
+            if key not in tables:
+                values = list(domain)
+                tables[key] = (values, {value: a for a, value in enumerate(values)})
+            numbering.append(tables[key])
+        width = max((len(values) for values, _ in tables.values()), default=0) + 1      # the last column is for the unassigned variables
+
+        # Assignments as a matrix assignment x variable of value numbers, -1 for the unassigned variables
+        encoded = np.full((len(solutions), size), -1, dtype=np.int64)
+        valid = np.ones(len(solutions), dtype=bool)
+        for k, solution in enumerate(solutions):
+            if solution.isNull():
+                valid[k] = False
+                continue
+            for var, value in solution.getAssignment().items():
+                i = self._ids.get(var)
+                if i is None:       # a variable outside the csp has only its domain to respect
+                    if value not in var.getActualDomain():
+                        valid[k] = False
+                    continue
+                a = numbering[i][1].get(value)
+                if a is None:
+                    valid[k] = False
+                else:
+                    encoded[k, i] = a
+
+        # Actual domains and unary constraints
+        allowed = np.ones((size, width), dtype=bool)
+        for i, var in enumerate(variables):
+            actual = var.getActualDomain()
+            unary = self._unaryConstraints.get(var, {})
+            for a, assignedValue in enumerate(numbering[i][0]):
+                allowed[i, a] = assignedValue in actual and all(constraints[0](assignedValue, value) for value, constraints in unary.items())
+            allowed[i, len(numbering[i][0]):width - 1] = False
+        rows = np.arange(size)
+        valid &= allowed[rows, encoded].all(axis=1)
+        if complete:
+            current = np.array(sorted(self._ids[var] for var in self._variables), dtype=np.int64)
+            valid &= (encoded[:, current] >= 0).all(axis=1)
+
+        # Binary constraints, grouped by constraint and domains
+        groups: Dict[tuple, Tuple[List[int], List[int]]] = {}
+        for i, adjacency in enumerate(self._binaryConstraints):
+            if adjacency is None:
+                continue
+            for j, code in zip(adjacency.neighbours, adjacency.constraints):
+                if j <= i:       # every constraint once
+                    continue
+                key = (code, id(numbering[i][0]), id(numbering[j][0]))
+                if key not in groups:
+                    groups[key] = ([], [])
+                groups[key][0].append(i)
+                groups[key][1].append(j)
+        for (code, _, _), (first, second) in groups.items():
+            constraint = self._constraints[code]
+            valuesI = numbering[first[0]][0]
+            valuesJ = numbering[second[0]][0]
+            matrix = np.ones((len(valuesI) + 1, len(valuesJ) + 1), dtype=bool)       # last row and column: unassigned
+            for a, valueX in enumerate(valuesI):
+                for b, valueY in enumerate(valuesJ):
+                    matrix[a, b] = constraint(valueX, valueY)
+            valid &= matrix[encoded[:, first], encoded[:, second]].all(axis=1)
+        return valid
+
     def printActualDomains(self) -> None:
         """
         prints actual domain for all variables
@@ -277,6 +605,153 @@ class CSP:
         for var in self._variables:
             print(var.getName() + ": " + str(var.getActualDomain()))
 
+    def save(self, path: str) -> None:
+        """
+        Saves the CSP in a versioned binary file, that load() opens with a memory map.
+        Only the constraints built on the functions of Constraints.py can be saved; values must be Python literals (numbers, strings, ...)
+        :param path: path of the file
+        :return: None
+        :raise CSPError: if a constraint's function isn't one of Constraints.py or a value can't be written as a literal
+        """
+        def constraintID(constraint: Constraint) -> int:
+            for k, function in enumerate(_FILE_CONSTRAINTS):
+                if constraint.getFunction() is function:
+                    return 2 * k + constraint.isDual()
+            raise CSPError
+
+        def valueID(value: Any) -> int:
+            key = (type(value), value)      # 1, 1.0 and True are different values
+            if key not in valueIDs:
+                literal = repr(value)
+                try:
+                    if literal_eval(literal) != value:
+                        raise CSPError
+                except (ValueError, SyntaxError):
+                    raise CSPError
+                valueIDs[key] = len(valueIDs)
+                literals.append(literal.encode('utf-8'))
+            return valueIDs[key]
+
+        variables = list(self._variables)
+        ids = {var: i for i, var in enumerate(variables)}
+        valueIDs: Dict[tuple, int] = {}
+        literals: List[bytes] = []
+        names = [var.getName().encode('utf-8') for var in variables]
+        domainOffsets = [0]
+        domainValues = []
+        hidden = []
+        for var in variables:
+            actual = var.getActualDomain()
+            for value in var.getInitialDomain():
+                domainValues.append(valueID(value))
+                hidden.append(value not in actual)
+            domainOffsets.append(len(domainValues))
+        edges = []
+        edgeConstraints = []
+        for var1, adjacency in self.getBinaryConstraints().items():
+            for var2, constraint in adjacency.items():
+                if ids[var1] <= ids[var2]:
+                    edges.append((ids[var1], ids[var2]))
+                    edgeConstraints.append(constraintID(constraint))
+        unary = []
+        unaryConstraints = []
+        for var in self._unaryConstraints:
+            for value in self._unaryConstraints[var]:
+                unary.append((ids[var], valueID(value)))
+                unaryConstraints.append(constraintID(self._unaryConstraints[var][value][0]))
+
+        sections = {
+            'names': np.frombuffer(b''.join(names), dtype=np.uint8),
+            'nameOffsets': np.cumsum([0] + [len(name) for name in names]),
+            'values': np.frombuffer(b''.join(literals), dtype=np.uint8),
+            'valueOffsets': np.cumsum([0] + [len(literal) for literal in literals]),
+            'domainOffsets': np.array(domainOffsets),
+            'domainValues': np.array(domainValues),
+            'hidden': np.array(hidden),
+            'edges': np.array(edges).reshape(-1),
+            'edgeConstraints': np.array(edgeConstraints),
+            'unary': np.array(unary).reshape(-1),
+            'unaryConstraints': np.array(unaryConstraints),
+        }
+        header = struct.pack('<8sII', _FILE_MAGIC, _FILE_VERSION, len(_FILE_SECTIONS))
+        offset = len(header) + 16 * len(_FILE_SECTIONS)
+        table = []
+        for name, dtype in _FILE_SECTIONS:
+            offset += -offset % 8
+            table.append((offset, len(sections[name])))
+            offset += len(sections[name]) * np.dtype(dtype).itemsize
+        with open(path, 'wb') as file:
+            file.write(header)
+            for entry in table:
+                file.write(struct.pack('<QQ', *entry))
+            for (name, dtype), (offset, length) in zip(_FILE_SECTIONS, table):
+                file.write(b'\x00' * (offset - file.tell()))
+                file.write(sections[name].astype(dtype, copy=False).tobytes())
+
+    @staticmethod
+    def loadArrays(path: str) -> Dict[str, np.ndarray]:
+        """
+        Opens a file written by save() without reading it: every section is a read-only view on a memory map of the file
+        :param path: path of the file
+        :return: dict with an array for every section ('edges' and 'unary' are (m, 2) and (u, 2) arrays)
+        :raise CSPError: if the file isn't a CSP file or its version isn't supported
+        """
+        raw = np.memmap(path, dtype=np.uint8, mode='r')
+        if len(raw) < 16:
+            raise CSPError
+        magic, version, count = struct.unpack('<8sII', raw[:16].tobytes())
+        if magic != _FILE_MAGIC or version != _FILE_VERSION or count != len(_FILE_SECTIONS):
+            raise CSPError
+        table = struct.unpack('<' + 'QQ' * count, raw[16:16 + 16 * count].tobytes())
+        arrays = {}
+        for k, (name, dtype) in enumerate(_FILE_SECTIONS):
+            offset, length = table[2 * k], table[2 * k + 1]
+            end = offset + length * np.dtype(dtype).itemsize
+            if end > len(raw):
+                raise CSPError
+            arrays[name] = raw[offset:end].view(dtype)
+        arrays['edges'] = arrays['edges'].reshape(-1, 2)
+        arrays['unary'] = arrays['unary'].reshape(-1, 2)
+        return arrays
+
+    @staticmethod
+    def load(path: str) -> CSP:
+        """
+        Builds the CSP saved in a file by save(). The arrays are read from the memory map and the constraints are stored directly,
+        with a single Constraint (and its dual) for every constraint ID
+        :param path: path of the file
+        :return: the CSP
+        :raise CSPError: if the file isn't a CSP file or its version isn't supported
+        """
+        arrays = CSP.loadArrays(path)
+        names = arrays['names'].tobytes()
+        nameOffsets = arrays['nameOffsets'].tolist()
+        literals = arrays['values'].tobytes()
+        valueOffsets = arrays['valueOffsets'].tolist()
+        values = [literal_eval(literals[valueOffsets[k]:valueOffsets[k + 1]].decode('utf-8')) for k in range(len(valueOffsets) - 1)]
+        domainOffsets = arrays['domainOffsets'].tolist()
+        domainValues = arrays['domainValues'].tolist()
+        hidden = arrays['hidden'].tolist()
+
+        csp = CSP()
+        variables = []
+        for i in range(len(nameOffsets) - 1):
+            domain = [values[k] for k in domainValues[domainOffsets[i]:domainOffsets[i + 1]]]
+            var = Variable(names[nameOffsets[i]:nameOffsets[i + 1]].decode('utf-8'), domain)
+            for k in range(domainOffsets[i], domainOffsets[i + 1]):
+                if hidden[k]:
+                    var.hideValue(values[domainValues[k]])
+            variables.append(var)
+            csp.addVariable(var)
+
+        constraints = [Constraint(_FILE_CONSTRAINTS[k // 2], k % 2 == 1) for k in range(2 * len(_FILE_CONSTRAINTS))]
+        codes = [csp._code(constraint) for constraint in constraints]
+        for (i, j), k in zip(arrays['edges'].tolist(), arrays['edgeConstraints'].tolist()):
+            csp._link(variables[i], variables[j], codes[k])
+        for (i, v), k in zip(arrays['unary'].tolist(), arrays['unaryConstraints'].tolist()):
+            csp._unaryConstraints.setdefault(variables[i], {})[values[v]] = [constraints[k]]
+        return csp
+
     def subproblem(self, assignment: Assignment, *, cheap: bool = False) -> CSP:
         """
         Given a (partial) assignment, it returns a csp with all unassigned variables and the new constraints to be satisfied in order to be consistent with original problem
@@ -288,17 +763,24 @@ class CSP:
         assignment = assignment.getAssignment()
         for var in self._variables-assignment.keys():   # copy all remaining variables
             csp.addVariable(var)
-        for var in set(self._unaryConstraints) & csp.getVariables():      # copy unary constraints involving remaining variables
+        remaining = csp.getVariables()
+        for var in set(self._unaryConstraints) & remaining:      # copy unary constraints involving remaining variables
             for value in self._unaryConstraints[var]:
                 csp.addUnaryConstraint(var, self._unaryConstraints[var][value][0], value)
-        for var in set(self._binaryConstraints) & csp.getVariables():     # copy binary constraints involving remaining variables
-            for var2 in set(self._binaryConstraints[var]) & csp.getVariables():
-                csp.addBinaryConstraint(var, self._binaryConstraints[var][var2][0], var2)
+        for var in remaining:     # copy binary constraints involving remaining variables
+            adjacency = self._adjacency(var)
+            if adjacency is not None:
+                for var2, constraint in adjacency.items():
+                    if var2 in remaining:
+                        csp.addBinaryConstraint(var, constraint, var2)
 
         if not cheap:
-            for var in set(assignment.keys()) & self._binaryConstraints.keys():      # for every binary constraints involving assigned variable, add unary constraint for the other variable involved
-                for var2 in set(self._binaryConstraints[var]) & csp.getVariables():
-                    csp.addUnaryConstraint(var2, self._binaryConstraints[var][var2][0].getDual(), assignment[var])
+            for var, value in assignment.items():      # for every binary constraints involving assigned variable, add unary constraint for the other variable involved
+                adjacency = self._adjacency(var)
+                if adjacency is not None:
+                    for var2, constraint in adjacency.items():
+                        if var2 in remaining:
+                            csp.addUnaryConstraint(var2, constraint.getDual(), value)
 
         return csp
 
@@ -309,70 +791,260 @@ class CSP:
         :param sub: subproblem
         :return: sub-CSP
         """
-        assignment = assignment.getAssignment()
-        for var in set(assignment.keys()) & self._binaryConstraints.keys():      # for every binary constraints involving assigned variable, add unary constraint for the other variable involved
-            for var2 in set(self._binaryConstraints[var]) & sub.getVariables():
-                sub.addUnaryConstraint(var2, self._binaryConstraints[var][var2][0].getDual(), assignment[var])
+        remaining = sub.getVariables()
+        for var, value in assignment.getAssignment().items():      # for every binary constraints involving assigned variable, add unary constraint for the other variable involved
+            adjacency = self._adjacency(var)
+            if adjacency is not None:
+                for var2, constraint in adjacency.items():
+                    if var2 in remaining:
+                        sub.addUnaryConstraint(var2, constraint.getDual(), value)
         return sub
 
     def adapt(self, var: Variable, value: Any, cheap: bool = False) -> None:
         """
-        Given an assignment for a var, transforms the csp into a subproblem
+        Given an assignment for a var, transforms the csp into a subproblem, in place.
+        Every change is pushed on an undo stack, so it can be reverted by restore
+        Execution time: O(deg^2)
         :param var: Variable assigned
         :param value: vale assigned
+        :param cheap: if True it doesn't set new unary constraint in order to save computation
+        :raise CSPError: if the variable isn't in the csp
         """
         if var not in self._variables:
             raise CSPError
 
         self._variables.remove(var)
-        self._unaryConstraints.pop(var, None)
-        for var2 in self._binaryConstraints[var]:
+        self._trail.append(('variable', var))
+        if var in self._unaryConstraints:
+            self._trail.append(('unary', var, self._unaryConstraints.pop(var)))
+        i = self._ids[var]
+        adjacency = self._binaryConstraints[i]
+        if adjacency is not None:
+            self._binaryConstraints[i] = None
+            self._arcCount -= len(adjacency.neighbours)
+            for j in adjacency.neighbours:
+                if j != i:
+                    self._binaryConstraints[j].remove(i)
+                    self._arcCount -= 1
+            self._trail.append(('binary', var, adjacency))
             if not cheap:
-                self.addUnaryConstraint(var2, self._binaryConstraints[var][var2][0].getDual(), value)
-            self._binaryConstraints[var2].pop(var)
-        self._binaryConstraints.pop(var, None)
-
+                for j, code in zip(adjacency.neighbours, adjacency.constraints):     # the constraint (var2, var) becomes a unary constraint for var2 with the value assigned
+                    if j == i:
+                        continue
+                    var2 = self._byID[j]
+                    unary = self._unaryConstraints.get(var2)
+                    created = unary is None
+                    if created:
+                        unary = self._unaryConstraints[var2] = {}
+                    if value not in unary:      # as addUnaryConstraint without override
+                        unary[value] = [self._constraints[self._duals[code]]]
+                        self._trail.append(('implied', var2, value, created))
 
-class CSPWorkingCopy:
-    def __init__(self, csp: CSP):
-        self._csp = copy(csp)
-        self._hiddenVars = set()
+    def snapshot(self) -> int:
+        """
+        :return: a mark of the actual state, to be passed to restore()
+        """
+        return len(self._trail)
 
-    def hideVar(self, var: Variable) -> None:
-        if var not in self._csp.getVariables():
+    def restore(self, mark: int) -> None:
+        """
+        Undoes every adapt made after the mark, in O(changes)
+        :param mark: mark returned by snapshot()
+        :return: None
+        :raise CSPError: if the mark is after the actual state
+        """
+        if mark > len(self._trail):
             raise CSPError
+        while len(self._trail) > mark:
+            change = self._trail.pop()
+            if change[0] == 'implied':
+                _, var, value, created = change
+                if created:
+                    del self._unaryConstraints[var]
+                else:
+                    del self._unaryConstraints[var][value]
+            elif change[0] == 'binary':
+                _, var, adjacency = change
+                i = self._ids[var]
+                self._binaryConstraints[i] = adjacency
+                self._arcCount += len(adjacency.neighbours)
+                for j, code in zip(adjacency.neighbours, adjacency.constraints):
+                    if j != i:
+                        self._binaryConstraints[j].insert(i, self._duals[code])
+                        self._arcCount += 1
+            elif change[0] == 'unary':
+                self._unaryConstraints[change[1]] = change[2]
+            else:
+                self._variables.add(change[1])
+
+
+class _MaskedConstraints(Mapping):
+    """
+    Read-only view of the binary constraints of a variable that hides the assigned neighbours
+    """
+    def __init__(self, constraints: Mapping[Variable, Constraint], assigned: Dict[Variable, Any]):
+        self._constraints = constraints
+        self._assigned = assigned
+
+    def __getitem__(self, var: Variable) -> Constraint:
+        if var in self._assigned:
+            raise KeyError(var)
+        return self._constraints[var]
+
+    def __contains__(self, var) -> bool:
+        return var in self._constraints and var not in self._assigned
+
+    def __iter__(self) -> Iterator[Variable]:
+        for var in self._constraints:
+            if var not in self._assigned:
+                yield var
+
+    def __len__(self) -> int:
+        return sum(1 for var in self._constraints if var not in self._assigned)
+
+
+class _ImpliedConstraints(Mapping):
+    """
+    Read-only view of the unary constraints of a variable, plus the ones implied by its assigned neighbours:
+    for a neighbour assigned to a value, the binary constraint with it becomes a unary constraint with that value.
+    As in CSP.subproblem, if there is already a constraint with a value, the implied one is ignored
+    """
+    def __init__(self, unary: Dict[Any, List[Constraint]], binary: Mapping[Variable, Constraint], assigned: Dict[Variable, Any]):
+        self._unary = unary
+        self._binary = binary
+        self._assigned = assigned
+
+    def items(self) -> Iterator[Tuple[Any, Sequence[Constraint]]]:
+        seen = set()
+        for value, constraints in self._unary.items():
+            seen.add(value)
+            yield value, constraints
+        for var, constraint in self._binary.items():
+            if var in self._assigned and self._assigned[var] not in seen:
+                seen.add(self._assigned[var])
+                yield self._assigned[var], (constraint,)      # the constraint is already (this variable, neighbour)
 
-        self._hiddenVars.add(var)
+    def __getitem__(self, value) -> Sequence[Constraint]:
+        if value in self._unary:
+            return self._unary[value]
+        for var, constraint in self._binary.items():
+            if var in self._assigned and self._assigned[var] == value:
+                return constraint,
+        raise KeyError(value)
 
-    def unhideVar(self, var: Variable) -> None:
-        if var not in self._csp.getVariables():
+    def __iter__(self) -> Iterator[Any]:
+        for value, _ in self.items():
+            yield value
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.items())
+
+
+class SubproblemView:
+    """
+    This class represent the subproblem left by a partial assignment, like CSP.subproblem, but without building a new CSP:
+    the assigned variables are masked and the unary constraints they imply are read from the binary ones of the original csp.
+    Nothing is copied except the assignment, so the view must not outlive changes to the csp
+    """
+    def __init__(self, csp: CSP, assignment: Assignment):
+        """
+        :param csp: original csp
+        :param assignment: already assigned variables
+        """
+        self._csp = csp
+        self._assigned = assignment.getAssignment()
+        self._count: Optional[int] = None
+
+    def _check(self, var: Variable) -> None:
+        """
+        :raise CSPError: if the variable isn't in the subproblem
+        """
+        if var in self._assigned:
             raise CSPError
 
-        self._hiddenVars.remove(var)
+    def getVariables(self) -> Set[Variable]:
+        """
+        :return: a defensive copy set with all unassigned variables
+        """
+        variables = self._csp.getVariables()
+        variables.difference_update(self._assigned)
+        return variables
+
+    def countVariables(self) -> int:
+        """
+        :return: number of unassigned variables
+        """
+        if self._count is None:
+            self._count = len(self.getVariables())
+        return self._count
+
+    def getBinaryConstraintsForVar(self, var: Variable) -> Mapping:
+        """
+        Returns all binary constraints that involve a variable and an unassigned one
+        :param var: variable to look for
+        :return: read-only dict-like view of the constraints
+        :raise CSPError: if var isn't an unassigned variable of the csp
+        """
+        self._check(var)
+        return _MaskedConstraints(self._csp.getBinaryConstraintsForVar(var), self._assigned)
+
+    def getUnaryConstraintsForVar(self, var: Variable) -> Mapping:
+        """
+        Returns all unary constraints that involve a variable, including the ones implied by the assigned variables
+        :param var: variable to look for
+        :return: read-only dict-like view of the constraints
+        :raise CSPError: if var isn't an unassigned variable of the csp
+        """
+        self._check(var)
+        return _ImpliedConstraints(self._csp.getUnaryConstraintsForVar(var), self._csp.getBinaryConstraintsForVar(var), self._assigned)
+
+    def findBinaryCostraint(self, var1: Variable, var2: Variable) -> Optional[Constraint]:
+        """
+        Returns the binary constraint existing between two unassigned variables
+        :return: constraint if it exists or None otherwise
+        """
+        if var1 in self._assigned or var2 in self._assigned:
+            return None
+        return self._csp.findBinaryCostraint(var1, var2)
+
+    def findUnaryConstraint(self, var: Variable, value) -> Optional[Constraint]:
+        """
+        Returns the unary constraint (also implied) existing between an unassigned variable and a value
+        :return: constraint if it exists or None otherwise
+        """
+        if var in self._assigned:
+            return None
+        constraints = self.getUnaryConstraintsForVar(var)
+        return constraints[value][0] if value in constraints else None
 
     def getEdges(self) -> Set[tuple]:
         """
-        Returns all tuples representing a constraint between two variables, including dual constraints
+        Returns all tuples representing a constraint between two unassigned variables, including dual constraints
         :return: set of tuple
         """
         edges = set()
-        for var1 in self._csp.getBinaryConstraints():
-            if var1 not in self._hiddenVars:
-                for var2 in self._csp.getBinaryConstraintsForVar(var1):
-                    if var2 not in self._hiddenVars:
-                        edges.add((var1, var2))
+        for var1 in self.getVariables():
+            for var2 in self.getBinaryConstraintsForVar(var1):
+                edges.add((var1, var2))
         return edges
 
-    def countNeighbours(self, var: Variable) -> int:
+    def getNeighbour(self, var: Variable) -> Set[tuple]:
         """
-        :param var: var to search for neighbours
-        :return: number of not hidden neighbours of var
+        Returns all tuples representing a constraint between an unassigned variable and its unassigned neighbours
+        :param var: variable to search for neighbour
+        :return: set of tuple
         """
-        count = 0
-        for var in self._csp.getBinaryConstraintsForVar(var).keys():
-            if var not in self._hiddenVars:
-                count += 1
-        return count
+        edges = set()
+        for var2 in self.getBinaryConstraintsForVar(var):
+            edges.add((var, var2))
+            edges.add((var2, var))
+        return edges
 
-    def getVariables(self) -> Set[Variable]:
-        return self._csp.getVariables() - self._hiddenVars
+    def toCSP(self) -> CSP:
+        """
+        :return: the subproblem as a new csp (see CSP.subproblem)
+        """
+        assignment = Assignment()
+        for var, value in self._assigned.items():
+            assignment.addVarAssigned(var, value)
+        return self._csp.subproblem(assignment)
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from typing import Callable
 from inspect import signature
+from weakref import WeakValueDictionary
 
 
 class ConstraintError(Exception):
@@ -11,21 +12,36 @@ class ConstraintError(Exception):
 class Constraint:
     """
     This class represent a constraint, substantially a function wrapper with some additional features.
-    A Constraint is immutable
+    A Constraint is immutable, so it is interned: there is a single Constraint for every (function, dual), shared by all the
+    constraints that use it, and its dual is built once
     """
-    def __init__(self, function: Callable[..., bool], dual: bool = False):
+    __slots__ = ('_function', '_cardinality', '_dual', '_inverse', '__weakref__')
+    _interned: WeakValueDictionary = WeakValueDictionary()
+
+    def __new__(cls, function: Callable[..., bool], dual: bool = False):
         """
         :param function: function that represent the constraint; it should accept exactly 2 params and return a bool
         :param dual: typically a constraint isn't commutative, if this param is setted to True, indicates that the constraint is the inverse of the function
         :raise ConstraintError: if the passed function doesn't accept exactly 2 params or it isn't a Callable
         """
+        key = (function, bool(dual))
+        constraint = cls._interned.get(key)
+        if constraint is not None:
+            return constraint
         if not isinstance(function, Callable):
             raise ConstraintError
-        self._function = function
-        self._cardinality = 2
-        self._dual: bool = dual
-        if len(signature(self._function).parameters) != self._cardinality:
+        constraint = super().__new__(cls)
+        constraint._function = function
+        constraint._cardinality = 2
+        constraint._dual = bool(dual)
+        constraint._inverse = None
+        if len(signature(function).parameters) != constraint._cardinality:
             raise ConstraintError
+        cls._interned[key] = constraint
+        return constraint
+
+    def __reduce__(self):
+        return Constraint, (self._function, self._dual)
 
     def __call__(self, value1, value2) -> bool:
         """
@@ -45,12 +61,26 @@ class Constraint:
         """
         return self._function.__name__
 
+    def getFunction(self) -> Callable[..., bool]:
+        """
+        :return: constraint's function
+        """
+        return self._function
+
+    def isDual(self) -> bool:
+        """
+        :return: True if the constraint is the inverse of the function, False otherwise
+        """
+        return self._dual
+
     def getDual(self) -> Constraint:
         """
         returns the inverse constraint
         :return: inverse constraint
         """
-        return Constraint(self._function, not self._dual)
+        if self._inverse is None:
+            self._inverse = Constraint(self._function, not self._dual)
+        return self._inverse
 
 
 def equals(a, b) -> bool:
@@ -0,0 +1,105 @@
+import os
+import random
+from typing import Dict, Tuple
+
+import numpy as np
+
+from Map import *
+
+
+class CorpusError(Exception):
+    pass
+
+
+class Corpus:
+    """
+    This class represent an on-disk corpus of generated maps, to benchmark the solvers always on the same instances.
+    Every map is identified by (n, numColor, minimalCutsetSize, seed, fast) and stored as two .npy files: the regions' coordinates
+    and the borders as indexes of the regions (.npz archives can't be memory-mapped). The first time a map is asked for
+    it is generated and stored; then it is memory-mapped back from the files, and kept in memory for the next requests.
+    The seed fixes the whole map, so a corpus can always be regenerated
+    """
+    def __init__(self, directory: str = 'corpus'):
+        """
+        :param directory: directory of the corpus' files, created if it doesn't exist
+        :raise CorpusError: if the path exists and isn't a directory
+        """
+        if os.path.exists(directory) and not os.path.isdir(directory):
+            raise CorpusError
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._maps: Dict[tuple, Map] = {}
+
+    def getDirectory(self) -> str:
+        """
+        :return: directory of the corpus' files
+        """
+        return self._directory
+
+    def _path(self, key: tuple) -> str:
+        """
+        :param key: map's parameters
+        :return: path of the map's files, without the suffix
+        """
+        n, numColor, minimalCutsetSize, seed, fast = key
+        name = 'map-' + str(n) + '-' + str(numColor) + '-' + str(minimalCutsetSize) + '-' + str(seed) + ('-fast' if fast else '')
+        return os.path.join(self._directory, name)
+
+    def contains(self, n: int, *, numColor: int = 4, minimalCutsetSize: int = 1, seed: int = 0, fast: bool = False) -> bool:
+        """
+        :return: True if the map with these parameters is already stored, False otherwise
+        """
+        path = self._path((n, numColor, minimalCutsetSize, seed, fast))
+        return os.path.exists(path + '.coordinates.npy') and os.path.exists(path + '.borders.npy')
+
+    def getArrays(self, n: int, *, numColor: int = 4, minimalCutsetSize: int = 1, seed: int = 0, fast: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the stored arrays of a map, generating and storing it if it isn't in the corpus
+        :param n: number of region
+        :param numColor: number of color for variables' domain in CSP
+        :param minimalCutsetSize: size of minimal cutset
+        :param seed: seed of the random generator
+        :param fast: if True the map is generated by generateMap's nearest-neighbour mode
+        :return: read-only memory-mapped arrays of the regions' coordinates (n, 2) and of the borders (m, 2)
+        """
+        key = (n, numColor, minimalCutsetSize, seed, fast)
+        path = self._path(key)
+        if not self.contains(n, numColor=numColor, minimalCutsetSize=minimalCutsetSize, seed=seed, fast=fast):
+            state = random.getstate()       # the global random generator is left as it was
+            random.seed(seed)
+            try:
+                m = generateMap(n, numColor=numColor, minimalCutsetSize=minimalCutsetSize, fast=fast)
+            finally:
+                random.setstate(state)
+            coordinates, borders = m.toArrays()
+            for suffix, array in (('.coordinates.npy', coordinates), ('.borders.npy', borders)):
+                with open(path + suffix + '.tmp', 'wb') as file:     # written apart and then renamed, so a file is never read half written
+                    np.save(file, array)
+                os.replace(path + suffix + '.tmp', path + suffix)
+            self._maps[key] = m
+        return np.load(path + '.coordinates.npy', mmap_mode='r'), np.load(path + '.borders.npy', mmap_mode='r')
+
+    def get(self, n: int, *, numColor: int = 4, minimalCutsetSize: int = 1, seed: int = 0, fast: bool = False) -> Map:
+        """
+        Returns a map of the corpus, generating and storing it if it isn't in the corpus.
+        The same Map is returned for the same parameters: build a new CSP with toCSP() for every solver
+        :param n: number of region
+        :param numColor: number of color for variables' domain in CSP
+        :param minimalCutsetSize: size of minimal cutset
+        :param seed: seed of the random generator
+        :param fast: if True the map is generated by generateMap's nearest-neighbour mode
+        :return: the map
+        """
+        key = (n, numColor, minimalCutsetSize, seed, fast)
+        if key not in self._maps:
+            coordinates, borders = self.getArrays(n, numColor=numColor, minimalCutsetSize=minimalCutsetSize, seed=seed, fast=fast)
+            if key not in self._maps:
+                self._maps[key] = Map.fromArrays(coordinates, borders, numColor)
+        return self._maps[key]
+
+    def clear(self) -> None:
+        """
+        Forgets the maps kept in memory; the files stay on disk
+        :return: None
+        """
+        self._maps.clear()
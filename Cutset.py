@@ -1,4 +1,5 @@
 from typing import Tuple
+from timeit import default_timer as timer
 
 from Backtrack import *
 from TreeSolver import *
@@ -7,12 +8,11 @@ import random
 
 
 def randomVar(csp: CSP, assignment: Assignment) -> Variable:
-    varAssignment: Dict[Variable] = assignment.getAssignment()
-    unassigned = [var for var in list(csp.getVariables() - varAssignment.keys())]
+    unassigned = [var for var in csp.getVariables() if not assignment.isAssigned(var)]
     return unassigned[int(random.uniform(0, len(unassigned)-1))]
 
 
-def isATree(csp: CSPWorkingCopy) -> bool:
+def isATree(csp: CSP) -> bool:
     def _dfs(edges_i: Set[tuple], root_i: Variable, parent: Union[Variable, None], visited: Set[Variable]) -> bool:
         """
         DeptFirstSearch-like algorithm
@@ -40,7 +40,7 @@ def isATree(csp: CSPWorkingCopy) -> bool:
         return True
 
     variables = csp.getVariables()
-    edges = csp.getEdges()
+    edges = set(csp.getEdges())       # _dfs removes the visited edges
 
     if len(variables) <= len(edges)/2:      # a tree have this property: #nodes = #edges + 1
         return False
@@ -53,36 +53,45 @@ def isATree(csp: CSPWorkingCopy) -> bool:
     return False
 
 
-def cutset(csp: CSP, *, heuristic=True) -> Tuple[Assignment, int]:
+def cutset(csp: CSP, *, heuristic=True, persistent: bool = False, stats: SolverStats = None, hooks: SearchHooks = None) -> Tuple[Assignment, int]:
     """
     Given a csp, find a possible assignment
     :param csp: csp of interest
     :param heuristic: if True variables' order is chosen by MRV-HD, if False is chosen randomly
+    :param persistent: if True the search nodes share their assignments' structure (PersistentAssignment)
+    :param stats: statistics to update (time in phases 'ac3', 'search' and 'treeSolve'); if None, nothing is counted
+    :param hooks: receiver of the search events (assign, undo, prune, wipeout, backtrack, tree solve start and end); if None, no event is sent
     :return: assignment that satisfies the csp, eventually null if it is unsatisfiable, and the size of remaining tree
     """
 
-    def backtrackSearch(csp_i: CSP, problem_wc: CSPWorkingCopy, assignment_i: Assignment = None) -> Optional[Assignment]:
+    def backtrackSearch(csp_i: CSP, conditioned: CSP, assignment_i: Assignment = None) -> Optional[Assignment]:
         """
         Executes backtracking search for a complete assignment of a csp
-        :param problem_wc: it keep track of assigned var, so checking for tree is much more performing
+        :param conditioned: copy of the csp without the assigned variables (adapted in place and restored on backtrack), so checking for tree is much more performing
         :param csp_i: csp of interest
         :param assignment_i: eventual partial assignment to respect
         :return: assignment if it exist, None otherwise
         """
         if assignment_i is None:      # if it's the init call, we run AC-3 and we initialize an assignment
-            if not AC3(csp_i):
+            if not AC3(csp_i, stats=stats):
                 return None
-            assignment_i = Assignment()
+            assignment_i = PersistentAssignment(csp_i.getVariables()) if persistent else Assignment(csp_i.getVariables())
 
-        if len(assignment_i.getAssignment()) == csp_i.countVariables():     # if the assignment is complete, we can return it
+        if assignment_i.countAssigned() == csp_i.countVariables():     # if the assignment is complete, we can return it
             return assignment_i
 
-        if isATree(problem_wc):
-            subproblem = csp_i.subproblem(assignment_i)
-            subAssignment = treeSolver(subproblem)
+        if stats is not None:
+            stats.treeTests += 1
+        if isATree(conditioned):
+            subproblem = SubproblemView(csp_i, assignment_i)        # the tree left by the cutset, without copying the csp
+            if hooks is not None:
+                hooks.treeSolveStart(subproblem.countVariables(), assignment_i.countAssigned())
+            subAssignment = treeSolver(subproblem, stats=stats)
+            if hooks is not None:
+                hooks.treeSolveEnd(not subAssignment.isNull(), assignment_i.countAssigned())
 
             nonlocal treeDimension
-            treeDimension = len(subproblem.getVariables())
+            treeDimension = subproblem.countVariables()
             if not subAssignment.isNull():
                 return subAssignment + assignment_i
             else:
@@ -92,22 +101,40 @@ def cutset(csp: CSP, *, heuristic=True) -> Tuple[Assignment, int]:
             var = orderVariables(csp_i, assignment_i)
         else:
             var = randomVar(csp_i, assignment_i)
-        values = orderDomainValues(csp_i, assignment_i, var)
+        values = orderDomainValues(csp_i, assignment_i, var, stats)
 
         for value in values:
+            if stats is not None:
+                stats.nodes += 1
             localAssignment = copy(assignment_i)            # we try to assign a var in a local copy of assignment
             localAssignment.addVarAssigned(var, value)
-            if MAC(csp_i, localAssignment, csp_i.getNeighbour(var)):      # if it's possible to complete the assignment, we iterate...
-                problem_wc.hideVar(var)
-                result = backtrackSearch(csp_i, problem_wc, localAssignment)
+            if hooks is not None:
+                hooks.assign(var, value, localAssignment.countAssigned())
+            if MAC(csp_i, localAssignment, csp_i.getNeighbour(var), stats=stats, hooks=hooks):      # if it's possible to complete the assignment, we iterate...
+                mark = conditioned.snapshot()
+                conditioned.adapt(var, value, cheap=True)       # only the graph is needed
+                result = backtrackSearch(csp_i, conditioned, localAssignment)
                 if result is not None:      # ... if it fails, we go back and propagate the None result
                     return result
                 else:
-                    problem_wc.unhideVar(var)
+                    conditioned.restore(mark)
+            if hooks is not None:
+                hooks.undo(var, value, localAssignment.countAssigned())
+        if stats is not None:
+            stats.backtracks += 1
+        if hooks is not None:
+            hooks.backtrack(var, assignment_i.countAssigned())
         return None
 
     treeDimension = 0
-    assignment = backtrackSearch(csp, CSPWorkingCopy(csp))
+    if stats is not None:
+        start = timer()
+        otherTime = stats.phases.get('ac3', 0.0) + stats.phases.get('treeSolve', 0.0)
+        stats.enterPhase('search')
+    assignment = backtrackSearch(csp, copy(csp))
+    if stats is not None:       # AC-3 and the tree solving have their own phases
+        stats.exitPhase('search')
+        stats.addTime('search', timer() - start - (stats.phases.get('ac3', 0.0) + stats.phases.get('treeSolve', 0.0) - otherTime))
     if assignment is None:
         nullAssignment = Assignment()
         nullAssignment.setNull()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Tuple
+
+from Variable import Variable
+
+
+class DomainsError(Exception):
+    pass
+
+
+class Domains:
+    """
+    This class represent a solver-local store of variables' actual domains.
+    Every domain is kept as a bitmask over the variable's initial domain, so hiding a value never touches the shared Variable objects.
+    Changes are recorded on a trail: snapshot() returns a mark and restore(mark) undoes every change made after it
+    """
+    def __init__(self, variables: Iterable[Variable] = ()):
+        """
+        :param variables: variables to store; their actual domain (excluding values already hidden) is the starting domain
+        """
+        self._values: Dict[Variable, List[Any]] = {}
+        self._index: Dict[Variable, Dict[Any, int]] = {}
+        self._masks: Dict[Variable, int] = {}
+        self._trail: List[Tuple[Variable, int]] = []
+        for var in variables:
+            self.addVariable(var)
+
+    def __copy__(self):
+        """
+        Independent copy: value tables and masks are copied (shallow: the per-variable tables are never changed) and the trail starts empty
+        """
+        newDomains = Domains()
+        newDomains._values = self._values.copy()
+        newDomains._index = self._index.copy()
+        newDomains._masks = self._masks.copy()
+        return newDomains
+
+    def addVariable(self, var: Variable) -> None:
+        """
+        Adds a variable to the store, starting from its actual domain
+        :param var: variable to be add
+        :return: None
+        :raise DomainsError: if var param is not a Variable
+        """
+        if not isinstance(var, Variable):
+            raise DomainsError
+
+        values = list(var.getInitialDomain())
+        actual = var.getActualDomain()
+        self._values[var] = values
+        self._index[var] = {value: i for i, value in enumerate(values)}
+        mask = 0
+        for i, value in enumerate(values):
+            if value in actual:
+                mask |= 1 << i
+        self._masks[var] = mask
+
+    def getActualDomain(self, var: Variable) -> set:
+        """
+        :param var: variable of interest
+        :return: variable's domain, excluding hidden values
+        :raise DomainsError: if the variable isn't in the store
+        """
+        if var not in self._masks:
+            raise DomainsError
+        mask = self._masks[var]
+        values = self._values[var]
+        return {values[i] for i in range(len(values)) if mask >> i & 1}
+
+    def getActualDomainSize(self, var: Variable) -> int:
+        """
+        :param var: variable of interest
+        :return: variable's domain's size, excluding hidden values
+        :raise DomainsError: if the variable isn't in the store
+        """
+        if var not in self._masks:
+            raise DomainsError
+        return bin(self._masks[var]).count('1')
+
+    def hideValue(self, var: Variable, value: Any) -> None:
+        """
+        Permits to hide a value from the variable's domain
+        :param var: variable of interest
+        :param value: value to hide
+        :return: None
+        :raise DomainsError: when the variable isn't in the store or the value doesn't exist in variable's domain
+        """
+        if var not in self._masks or value not in self._index[var]:
+            raise DomainsError
+        mask = self._masks[var]
+        newMask = mask & ~(1 << self._index[var][value])
+        if newMask != mask:
+            self._trail.append((var, mask))
+            self._masks[var] = newMask
+
+    def snapshot(self) -> int:
+        """
+        :return: a mark of the actual state, to be passed to restore()
+        """
+        return len(self._trail)
+
+    def restore(self, mark: int) -> None:
+        """
+        Undoes every change made after the mark, in O(changes)
+        :param mark: mark returned by snapshot()
+        :return: None
+        """
+        while len(self._trail) > mark:
+            var, mask = self._trail.pop()
+            self._masks[var] = mask
+
+
+class VariableDomains(Domains):
+    """
+    This class represent the store of actual domains kept by the Variables themselves: hiding a value here hides it on the shared Variable.
+    Solvers use it when no local store is passed, so their behaviour on the caller's CSP is unchanged
+    """
+    def __init__(self):
+        super().__init__()
+        self._hidden: List[Tuple[Variable, Any]] = []
+
+    def __copy__(self):
+        """
+        The Variables can't be duplicated: build a Domains from the csp's variables to get an independent store
+        :raise DomainsError: always
+        """
+        raise DomainsError
+
+    def addVariable(self, var: Variable) -> None:
+        if not isinstance(var, Variable):
+            raise DomainsError
+
+    def getActualDomain(self, var: Variable) -> set:
+        return var.getActualDomain()
+
+    def getActualDomainSize(self, var: Variable) -> int:
+        return var.getActualDomainSize()
+
+    def hideValue(self, var: Variable, value: Any) -> None:
+        if not var.validValue(value):
+            raise DomainsError
+        if value in var.getActualDomain():
+            var.hideValue(value)
+            self._hidden.append((var, value))
+
+    def snapshot(self) -> int:
+        return len(self._hidden)
+
+    def restore(self, mark: int) -> None:
+        while len(self._hidden) > mark:
+            var, value = self._hidden.pop()
+            var.unhideValue(value)
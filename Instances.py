@@ -0,0 +1,190 @@
+import gzip
+from typing import Any, Dict, Iterator, List, Set, Tuple
+from xml.etree.ElementTree import iterparse
+
+from CSP import *
+
+
+class InstanceError(Exception):
+    pass
+
+
+class Relation:
+    """
+    This class represent an extensional binary relation: the set of its tuples and if they are the allowed (supports) or forbidden (conflicts) ones.
+    It can be wrapped in a Constraint like a function of 2 params, and it is shared by all the constraints that refer to it
+    """
+    def __init__(self, name: str, tuples: Set[Tuple[Any, Any]], supports: bool = True):
+        """
+        :param name: relation's name
+        :param tuples: couples of values
+        :param supports: if True the tuples are the allowed ones, if False the forbidden ones
+        """
+        self.__name__ = name
+        self._tuples = tuples
+        self._supports = supports
+
+    def __call__(self, a, b) -> bool:
+        return ((a, b) in self._tuples) == self._supports
+
+    def conjunction(self, other: 'Relation', reverse: bool = False) -> 'Relation':
+        """
+        :param other: relation that must hold too
+        :param reverse: if True other is applied with the values swapped (its scope is the reverse of this one)
+        :return: new relation that holds only where both hold
+        """
+        tuples = {(b, a) for a, b in other._tuples} if reverse else other._tuples
+        name = self.__name__ + '&' + other.__name__
+        if self._supports and other._supports:
+            return Relation(name, self._tuples & tuples, True)
+        if self._supports:
+            return Relation(name, self._tuples - tuples, True)
+        if other._supports:
+            return Relation(name, tuples - self._tuples, True)
+        return Relation(name, self._tuples | tuples, False)
+
+
+def _open(path: str):
+    """
+    :param path: path of the file, eventually compressed by gzip (.gz)
+    :return: file opened for reading
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def readDIMACS(path: str, *, numColor: int = 4) -> CSP:
+    """
+    Reads a graph colouring instance in DIMACS format (.col): comment lines "c ...", the problem line "p edge <vertices> <edges>"
+    and a line "e <u> <v>" for every edge, with vertices numbered from 1.
+    The file is read line by line and every edge is passed straight to the CSP, so only the final model is kept in memory
+    :param path: path of the file, eventually compressed by gzip (.gz)
+    :param numColor: number of colors, the domain of every vertex is range(numColor)
+    :return: csp with a variable named as its vertex for every vertex and a different constraint for every edge
+    :raise InstanceError: if the file isn't a valid DIMACS graph
+    """
+    def edges(file_i) -> Iterator[Tuple[Variable, Constraint, Variable]]:
+        """
+        Reads the lines after the problem line
+        :param file_i: opened file
+        :return: generator of the constraints
+        """
+        for line_i in file_i:
+            if line_i.startswith(b'e'):
+                fields_i = line_i.split()
+                try:
+                    u, v = int(fields_i[1]), int(fields_i[2])
+                except (IndexError, ValueError):
+                    raise InstanceError
+                if not (1 <= u <= len(variables) and 1 <= v <= len(variables)):
+                    raise InstanceError
+                yield variables[u - 1], constraint, variables[v - 1]
+            elif not line_i.startswith(b'c') and len(line_i.strip()) != 0:
+                raise InstanceError
+
+    csp = CSP()
+    constraint = Constraint(different)
+    variables: List[Variable] = []
+    with _open(path) as file:
+        for line in file:
+            if line.startswith(b'p'):
+                fields = line.split()
+                if len(fields) != 4 or fields[1] not in (b'edge', b'col'):
+                    raise InstanceError
+                for i in range(1, int(fields[2]) + 1):
+                    variables.append(Variable(str(i), range(numColor)))
+                    csp.addVariable(variables[-1])
+                break
+            elif not line.startswith(b'c') and len(line.strip()) != 0:
+                raise InstanceError
+        else:
+            raise InstanceError     # there isn't a problem line
+        csp.addBinaryConstraints(edges(file))
+    return csp
+
+
+def _parseValues(text: str) -> List[int]:
+    """
+    :param text: values of an XCSP domain, separated by spaces, where "a..b" is the interval of integers from a to b
+    :return: values
+    """
+    values = []
+    for field in text.split():
+        if '..' in field:
+            start, end = field.split('..')
+            values.extend(range(int(start), int(end) + 1))
+        else:
+            values.append(int(field))
+    return values
+
+
+def readXCSP(path: str) -> CSP:
+    """
+    Reads a binary CSP in XCSP 2.1 format with extensional relations: <domain>, <variable>, <relation> (tuples "a b|c d|...",
+    semantics "supports" or "conflicts") and <constraint> (scope of 2 variables and reference to a relation).
+    The XML is parsed incrementally and every element is discarded after it has been read; constraints that refer to the same relation
+    share a single Constraint. Several constraints on the same couple of variables must all hold, so they are merged
+    in a single relation that is their conjunction
+    :param path: path of the file, eventually compressed by gzip (.gz)
+    :return: csp
+    :raise InstanceError: if the file isn't a valid XCSP instance or it has a constraint that isn't binary and extensional
+    """
+    def constraints(file_i) -> Iterator[Tuple[Variable, Constraint, Variable]]:
+        """
+        Reads the elements of the file, building domains, variables and relations, and gives the constraints
+        :param file_i: opened file
+        :return: generator of the constraints
+        """
+        for event_i, element in iterparse(file_i, events=('end',)):
+            tag = element.tag
+            if tag == 'domain':
+                domains[element.get('name')] = _parseValues(element.text or '')
+            elif tag == 'variable':
+                if element.get('domain') not in domains:
+                    raise InstanceError
+                variables[element.get('name')] = Variable(element.get('name'), domains[element.get('domain')])
+                csp.addVariable(variables[element.get('name')])
+            elif tag == 'relation':
+                if element.get('arity') != '2' or element.get('semantics') not in ('supports', 'conflicts'):
+                    raise InstanceError
+                tuples = set()
+                for pair in (element.text or '').split('|'):
+                    values = pair.split()
+                    if len(values) == 2:
+                        tuples.add((int(values[0]), int(values[1])))
+                    elif len(values) != 0:
+                        raise InstanceError
+                relations[element.get('name')] = Constraint(Relation(element.get('name'), tuples, element.get('semantics') == 'supports'))
+            elif tag == 'constraint':
+                scope = (element.get('scope') or '').split()
+                if len(scope) != 2 or element.get('reference') not in relations or scope[0] not in variables or scope[1] not in variables:
+                    raise InstanceError
+                x, y, constraint = variables[scope[0]], variables[scope[1]], relations[element.get('reference')]
+                if (x, y) in scopes or (y, x) in scopes:
+                    reverse = (x, y) not in scopes
+                    if reverse:
+                        x, y = y, x
+                    merged = scopes[(x, y)].getFunction().conjunction(constraint.getFunction(), reverse)
+                    scopes[(x, y)] = Constraint(merged)
+                    csp.addBinaryConstraint(x, scopes[(x, y)], y, override=True)
+                else:
+                    scopes[(x, y)] = constraint
+                    yield x, constraint, y
+            elif tag in ('predicate', 'function'):      # intensional constraints aren't supported
+                raise InstanceError
+            else:
+                continue
+            element.clear()
+
+    csp = CSP()
+    domains: Dict[str, List[int]] = {}
+    variables: Dict[str, Variable] = {}
+    relations: Dict[str, Constraint] = {}
+    scopes: Dict[Tuple[Variable, Variable], Constraint] = {}     # constraint of every couple of variables, as it is in the csp
+    with _open(path) as file:
+        try:
+            csp.addBinaryConstraints(constraints(file))
+        except (ValueError, SyntaxError):
+            raise InstanceError
+    return csp
@@ -1,9 +1,11 @@
 from __future__ import annotations
 import random
-from math import sqrt
+from math import sqrt, nextafter
 import matplotlib.pyplot as plt
+import numpy as np
 from CSP import *
-from sys import setrecursionlimit
+from typing import Tuple, Iterator, Union
+from heapq import heappush, heapreplace
 
 
 class Point:
@@ -21,14 +23,242 @@ class Point:
         return sqrt((self._x - target.x())**2 + (self._y - target.y())**2)
 
 
-class MapException:
+class MapException(Exception):
     pass
 
 
+class SegmentIndex:
+    """
+    Uniform grid over the unit square used as spatial index of segments: every segment is stored in the cells it crosses,
+    so a query returns only the segments that cross the same cells of the queried one.
+    Segments are enlarged by a margin bigger than checkIntersect's tolerance, so no intersecting segment is ever missed
+    """
+    margin = 0.001
+
+    def __init__(self, cells: int):
+        """
+        :param cells: number of cells for each side of the grid
+        """
+        self._cells = max(1, cells)
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+
+    def _cell(self, c: float) -> int:
+        """
+        :param c: coordinate
+        :return: index of the column (or row) containing the coordinate; points outside the unit square fall in the border cells
+        """
+        return min(self._cells - 1, max(0, int(c * self._cells)))
+
+    def _crossedCells(self, segment: np.ndarray) -> Iterator[Tuple[int, int]]:
+        """
+        Column by column, computes the rows crossed by the segment in that column, going from its start to its end
+        :param segment: segment as (x1, y1, x2, y2)
+        :return: iterator over the cells within margin from the segment
+        """
+        ax, ay, bx, by = (float(c) for c in segment)
+        backward = ax > bx
+        if backward:
+            ax, ay, bx, by = bx, by, ax, ay
+        columns = range(self._cell(ax - self.margin), self._cell(bx + self.margin) + 1)
+        for i in (reversed(columns) if backward else columns):
+            x0 = ax if i == 0 else max(ax, i / self._cells - self.margin)       # part of the segment inside the (enlarged) column
+            x1 = bx if i == self._cells - 1 else min(bx, (i + 1) / self._cells + self.margin)
+            if x0 > x1:
+                continue
+            if bx - ax > 0:
+                y0 = ay + (by - ay) * (x0 - ax) / (bx - ax)
+                y1 = ay + (by - ay) * (x1 - ax) / (bx - ax)
+            else:
+                y0, y1 = ay, by
+            if backward:
+                y0, y1 = y1, y0
+            rows = range(self._cell(min(y0, y1) - self.margin), self._cell(max(y0, y1) + self.margin) + 1)
+            for j in (reversed(rows) if y0 > y1 else rows):
+                yield i, j
+
+    def add(self, row: int, segment: np.ndarray) -> None:
+        """
+        Adds a segment to the index
+        :param row: identifier of the segment (its row in the segments' array)
+        :param segment: segment as (x1, y1, x2, y2)
+        """
+        for cell in self._crossedCells(segment):
+            self._grid.setdefault(cell, []).append(row)
+
+    def query(self, segment: np.ndarray) -> np.ndarray:
+        """
+        :param segment: segment as (x1, y1, x2, y2)
+        :return: identifiers, without repetitions, of the segments that cross a cell crossed by the queried one
+        """
+        rows = set()
+        for cell in self._crossedCells(segment):
+            rows.update(self._grid.get(cell, ()))
+        return np.fromiter(rows, dtype=np.intp, count=len(rows))
+
+    def around(self, x: float, y: float) -> np.ndarray:
+        """
+        :param x: x of the point
+        :param y: y of the point
+        :return: identifiers, without repetitions, of the segments that cross the cell of the point or one of the 8 cells around it
+        """
+        i, j = self._cell(x), self._cell(y)
+        rows = set()
+        for k in range(max(0, i - 1), min(self._cells, i + 2)):
+            for h in range(max(0, j - 1), min(self._cells, j + 2)):
+                rows.update(self._grid.get((k, h), ()))
+        return np.fromiter(rows, dtype=np.intp, count=len(rows))
+
+
+class Links:
+    """
+    This class represent a set of links between points, kept as an (m, 4) float array of segments (x1, y1, x2, y2)
+    and as an (m, 2) array of points' indexes, without a tuple of Points for every link
+    """
+    def __init__(self, points: List[Point], cells: int = None):
+        """
+        :param points: points that can be linked
+        :param cells: number of cells for each side of the spatial index; if None, it is the square root of the number of points
+        """
+        self._points = points
+        self._ids: Dict[Point, int] = {p: k for k, p in enumerate(points)}
+        self._segments = np.empty((16, 4))
+        self._ends = np.empty((16, 2), dtype=np.intp)
+        self._pairs: Set[Tuple[int, int]] = set()
+        self._size = 0
+        self._index = SegmentIndex(int(sqrt(len(points))) if cells is None else cells)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, link: tuple) -> bool:
+        """
+        :param link: couple of points
+        :return: True if the points are linked, in any direction
+        """
+        i, j = self._ids[link[0]], self._ids[link[1]]
+        return (i, j) in self._pairs or (j, i) in self._pairs
+
+    def add(self, a: Point, b: Point) -> None:
+        """
+        Adds the link AB
+        :param a: start of link
+        :param b: end of link
+        """
+        if self._size == len(self._segments):      # the arrays grow by doubling
+            self._segments = np.concatenate((self._segments, np.empty_like(self._segments)))
+            self._ends = np.concatenate((self._ends, np.empty_like(self._ends)))
+        self._segments[self._size] = (a.x(), a.y(), b.x(), b.y())
+        self._ends[self._size] = (self._ids[a], self._ids[b])
+        self._pairs.add((self._ids[a], self._ids[b]))
+        self._index.add(self._size, self._segments[self._size])
+        self._size += 1
+
+    def getSegments(self) -> np.ndarray:
+        """
+        :return: (m, 4) read-only view of the segments
+        """
+        segments = self._segments[:self._size]
+        segments.flags.writeable = False
+        return segments
+
+    def getEnds(self) -> np.ndarray:
+        """
+        :return: (m, 2) read-only view of the indexes of the linked points
+        """
+        ends = self._ends[:self._size]
+        ends.flags.writeable = False
+        return ends
+
+    def getPoint(self, i: int) -> Point:
+        """
+        :param i: index of a point
+        :return: the point
+        """
+        return self._points[i]
+
+    def near(self, a: Point, b: Point) -> np.ndarray:
+        """
+        :param a: start of segment
+        :param b: end of segment
+        :return: (k, 4) array of the links that cross the same cells of the segment AB
+        """
+        return self._segments[self._index.query(np.array((a.x(), a.y(), b.x(), b.y())))]
+
+    def around(self, a: Point) -> np.ndarray:
+        """
+        :param a: point
+        :return: (k, 4) array of the links that cross the cells around A
+        """
+        return self._segments[self._index.around(a.x(), a.y())]
+
+
+class KDTree:
+    """
+    This class represent a 2-d tree over a set of points, for k-nearest-neighbour queries in O(log n).
+    Points are split by the median of the coordinate with the biggest spread, until buckets of at most leafSize points
+    """
+    leafSize = 16
+
+    def __init__(self, coordinates: np.ndarray):
+        """
+        Execution time: O(n log n)
+        :param coordinates: (n, 2) float array of the points
+        """
+        self._x: List[float] = coordinates[:, 0].tolist()
+        self._y: List[float] = coordinates[:, 1].tolist()
+        order = np.arange(len(coordinates))
+        self._nodes: List[list] = []        # [start, end, axis, split, left child, right child] over self._order
+        stack = [(0, len(order), None, 0)]
+        while len(stack) != 0:
+            start, end, parent, side = stack.pop()
+            node = [start, end, -1, 0.0, -1, -1]
+            if parent is not None:
+                self._nodes[parent][4 + side] = len(self._nodes)
+            self._nodes.append(node)
+            if end - start > self.leafSize:
+                points = coordinates[order[start:end]]
+                axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+                middle = (end - start) // 2
+                order[start:end] = order[start:end][np.argpartition(points[:, axis], middle)]
+                node[2] = axis
+                node[3] = float(coordinates[order[start + middle], axis])
+                stack.append((start, start + middle, len(self._nodes) - 1, 0))
+                stack.append((start + middle, end, len(self._nodes) - 1, 1))
+        self._order: List[int] = order.tolist()
+
+    def query(self, x: float, y: float, k: int) -> List[int]:
+        """
+        :param x: x of the point
+        :param y: y of the point
+        :param k: number of neighbours
+        :return: indexes of the k points nearest to (x, y), from the nearest; the point itself is included if it belongs to the tree
+        """
+        best: List[Tuple[float, int]] = []      # max-heap (by negated distance) of the k nearest found
+        stack = [(0, 0.0)]
+        while len(stack) != 0:
+            node, bound = stack.pop()
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+            start, end, axis, split, left, right = self._nodes[node]
+            if axis == -1:
+                for i in self._order[start:end]:
+                    distance = (self._x[i] - x)**2 + (self._y[i] - y)**2
+                    if len(best) < k:
+                        heappush(best, (-distance, i))
+                    elif distance < -best[0][0]:
+                        heapreplace(best, (-distance, i))
+                continue
+            gap = (x if axis == 0 else y) - split
+            near, far = (left, right) if gap < 0 else (right, left)
+            stack.append((far, gap**2))     # the far side is visited later, only if it can contain a nearer point
+            stack.append((near, bound))
+        return [i for distance, i in sorted(best, reverse=True)]
+
+
 class Map:
     def __init__(self, color: int = 4):
-        self._region: Set[Point] = set()
-        self._borders: Set[tuple] = set()
+        self._region: Dict[Point, None] = {}        # dicts as insertion-ordered sets: Points hash by id, so a set's order changes at every run
+        self._borders: Dict[tuple, None] = {}
         colorList = ['red', 'blue', 'green', 'yellow']
         self._color: List = []
         for i in range(color):
@@ -36,21 +266,21 @@ class Map:
 
     def addRegion(self, p: Point) -> None:
         if isinstance(p, Point):
-            self._region.add(p)
+            self._region[p] = None
         else:
             raise MapException
 
     def addBorder(self, p1: Point, p2: Point) -> None:
         if isinstance(p1, Point) and isinstance(p2, Point):
-            self._borders.add((p1, p2))
+            self._borders[(p1, p2)] = None
         else:
             raise MapException
 
     def getRegions(self) -> Set[Point]:
-        return self._region.copy()
+        return set(self._region)
 
     def getBorders(self) -> Set[tuple]:
-        return self._borders.copy()
+        return set(self._borders)
 
     def toCSP(self) -> CSP:
         """
@@ -58,13 +288,45 @@ class Map:
         :return: the CSP
         """
         csp = CSP()
+        variables: Dict[Point, Variable] = {}
         for p in self._region:
             v = Variable('region '+str('%.3f' % p.x())+'-'+str('%.3f' % p.y()), self._color)
             csp.addVariable(v)
+            variables[p] = v
         for l in self._borders:
-            csp.addBinaryConstraint(csp.getVariable('region '+str('%.3f' % l[0].x())+'-'+str('%.3f' % l[0].y())), Constraint(different), csp.getVariable('region '+str('%.3f' % l[1].x())+'-'+str('%.3f' % l[1].y())))
+            csp.addBinaryConstraint(variables[l[0]], Constraint(different), variables[l[1]])
         return csp
 
+    def toArrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Transforms the map into arrays, without a Point object for every region
+        :return: (n, 2) float array of the regions' coordinates and (m, 2) int array of the borders, as indexes of the regions
+        """
+        regions = list(self._region)
+        ids: Dict[Point, int] = {p: k for k, p in enumerate(regions)}
+        coordinates = np.array([(p.x(), p.y()) for p in regions], dtype=np.float64).reshape(-1, 2)
+        borders = np.array([(ids[l[0]], ids[l[1]]) for l in self._borders], dtype=np.int32).reshape(-1, 2)
+        return coordinates, borders
+
+    @staticmethod
+    def fromArrays(coordinates: np.ndarray, borders: np.ndarray, color: int = 4) -> Map:
+        """
+        Builds a map from the arrays given by toArrays
+        :param coordinates: (n, 2) float array of the regions' coordinates
+        :param borders: (m, 2) int array of the borders, as indexes of the regions
+        :param color: number of colors
+        :return: the map
+        :raise MapException: if a border refers to a region that doesn't exist
+        """
+        m = Map(color)
+        regions = [Point(x, y) for x, y in np.asarray(coordinates).tolist()]
+        m._region = dict.fromkeys(regions)
+        for i, j in np.asarray(borders).tolist():
+            if not (0 <= i < len(regions) and 0 <= j < len(regions)):
+                raise MapException
+            m._borders[(regions[i], regions[j])] = None
+        return m
+
     def plot(self) -> None:
         """
         Plots the map
@@ -148,7 +410,90 @@ def checkIntersect(a: Point, b: Point, c: Point, d: Point) -> bool:
         return False
 
 
-def linkPossible(links: Set[tuple], a: Point, b: Point) -> bool:
+def _roundedBounds() -> Tuple[float, float]:
+    """
+    Finds the smallest and the biggest float t such that 0 < round(t, 5) < 1: comparing with them is equivalent to checkIntersect's rounding
+    :return: the two bounds
+    """
+    low = 0.000005
+    while round(low, 5) <= 0:
+        low = nextafter(low, 1)
+    while round(nextafter(low, 0), 5) > 0:
+        low = nextafter(low, 0)
+    high = 0.999995
+    while round(high, 5) >= 1:
+        high = nextafter(high, 0)
+    while round(nextafter(high, 1), 5) < 1:
+        high = nextafter(high, 1)
+    return low, high
+
+
+_ROUNDED_MIN, _ROUNDED_MAX = _roundedBounds()
+
+
+def checkIntersectMany(a: Point, b: Union[Point, np.ndarray], segments: np.ndarray) -> np.ndarray:
+    """
+    Checks, in a single vectorized pass, if every segment intersects segment AB.
+    For every row it gives the same result of checkIntersect(row start, row end, a, b), with 0.00005 precision and rounding to 5 places
+    (the rounded parameters are compared through their exact bounds, see _roundedBounds).
+    B can also be a (k, 2) array of ends: then all the k segments starting from A are checked at once
+    :param a: start of segment AB
+    :param b: end of segment AB, or (k, 2) float array of ends
+    :param segments: (m, 4) float array of segments (x1, y1, x2, y2)
+    :return: (m,) boolean array, True where the segment intersects AB, or (k, m) boolean array if B is an array of ends
+    """
+    tolerance = 0.00005
+
+    def onSegment(ax1, ay1, bx1, by1, px1, py1) -> np.ndarray:
+        """
+        Vectorized version of checkIntersect's onSegment: checks if points P lie on segments AB
+        :return: boolean array
+        """
+        vertical = np.abs(bx1 - ax1) < tolerance
+        horizontal = np.abs(by1 - ay1) < tolerance
+        with np.errstate(divide='ignore', invalid='ignore'):     # t1 and t2 are inf or nan on vertical and horizontal segments, not used
+            t1 = (px1 - ax1) / (bx1 - ax1)
+            t2 = (py1 - ay1) / (by1 - ay1)
+            oblique = (np.abs(t1 - t2) < tolerance) & (0 < t1) & (t1 < 1)
+        return np.where(vertical, (np.abs(px1 - ax1) < tolerance) & (np.minimum(ay1, by1) < py1) & (py1 < np.maximum(ay1, by1)),
+                        np.where(horizontal, (np.abs(py1 - ay1) < tolerance) & (np.minimum(ax1, bx1) < px1) & (px1 < np.maximum(ax1, bx1)), oblique))
+
+    single = isinstance(b, Point)
+    ends = np.array([[b.x(), b.y()]]) if single else b
+    ax, ay, bx, by = segments[:, 0], segments[:, 1], segments[:, 2], segments[:, 3]
+    cx, cy = a.x(), a.y()
+    dx, dy = ends[:, 0:1], ends[:, 1:2]
+
+    # same operations, in the same order, of checkIntersect, so the results are the same
+    axbx = ax - bx
+    ayby = ay - by
+    dxbx = dx - bx
+    dyby = dy - by
+    dycy = dy - cy
+    dxcx = dx - cx
+    det = (axbx * dycy) - (dxcx * ayby)
+    dt = (dxbx * dycy) - (dxcx * dyby)
+    ds = (axbx * dyby) - (dxbx * ayby)
+    general = np.abs(det) > tolerance
+    safeDet = np.where(general, det, 1.0)
+    t = dt / safeDet
+    s = ds / safeDet
+    result = general & (t >= _ROUNDED_MIN) & (t <= _ROUNDED_MAX) & (s >= _ROUNDED_MIN) & (s <= _ROUNDED_MAX)
+    parallel = ~general
+    if parallel.any():      # nearly parallel segments are checked on their endpoints, like checkIntersect does
+        rows, columns = np.nonzero(parallel)
+        ax, ay, bx, by = ax[columns], ay[columns], bx[columns], by[columns]
+        dx, dy = dx[rows, 0], dy[rows, 0]
+        cx, cy = np.full(len(ax), cx), np.full(len(ax), cy)
+        # the four endpoint checks are stacked in a single call
+        onSegments = onSegment(np.concatenate((ax, ax, cx, cx)), np.concatenate((ay, ay, cy, cy)),
+                               np.concatenate((bx, bx, dx, dx)), np.concatenate((by, by, dy, dy)),
+                               np.concatenate((cx, dx, ax, bx)), np.concatenate((cy, dy, ay, by)))
+        result[parallel] = onSegments.reshape(4, -1).any(axis=0)
+    return result[0] if single else result
+
+
+def linkPossible(links: Links, a: Point, b: Point) -> bool:
     """
     Checks if 2 points are linkable, given a set of links. In particular the link must not already be in links and don't intersect other links
     :param links: set of links
@@ -156,47 +501,57 @@ def linkPossible(links: Set[tuple], a: Point, b: Point) -> bool:
     :param b: end of link
     :return: True if A and B are linkable, False otherwise
     """
-    possible = True
-    for link in links:
-        if not (isinstance(link[0], Point) and isinstance(link[1], Point)):
-            raise Exception
-        inter = checkIntersect(link[0], link[1], a, b)
-        if (a, b) in links or (b, a) in links or inter:
-            if inter:
-                checkIntersect(link[0], link[1], a, b)
-            possible = False
-            break
-    return possible
+    if len(links) == 0:
+        return True
+    if (a, b) in links:
+        return False
+    return not checkIntersectMany(a, b, links.near(a, b)).any()
 
 
-def generateMap(n: int, *, numColor: int = 4, minimalCutsetSize: int = 1) -> Map:
+def generateMap(n: int, *, numColor: int = 4, minimalCutsetSize: int = 1, fast: bool = False) -> Map:
     """
     Generate a map like explained in R&N 2010 exercise 6.10 (then finds a spanning tree and adds some links)
     :param minimalCutsetSize: size of minimal cutset
     :param numColor: number of color for variables' domain in CSP
     :param n: number of region
+    :param fast: if True, every point is linked only to its nearest neighbours (found with a KD-tree) and the regions of the cutset
+        are linked only to their nearest visible regions, so the map is generated in O(n log n) instead of O(n^2 log n)
     :return: generated map
     """
-    def generatePoints(n_i: int) -> Set[Point]:
+    def generatePoints(n_i: int) -> List[Point]:
         """
         Generates n points in the unit square
         :param n_i: number of points
-        :return: set of points
+        :return: list of points, in order of generation
         """
-        points_i = set()
+        points_i = []
         for i in range(0, n_i):
-            points_i.add(Point(random.uniform(0, 1), random.uniform(0, 1)))
+            points_i.append(Point(random.uniform(0, 1), random.uniform(0, 1)))
         return points_i
 
-    def _dfs(root: Point, visited: Set[Point], links_i: Set[tuple], edges_i: Set[tuple]):
-        visited.add(root)
-        for link in links_i:
-            if link[0] is root and link[1] not in visited:
-                edges_i.add(link)
-                _dfs(link[1], visited, links_i, edges_i)
-            elif link[1] is root and link[0] not in visited:
-                edges_i.add(link)
-                _dfs(link[0], visited, links_i, edges_i)
+    def _dfs(root: int, adjacency_i: List[List[int]], ends_i: np.ndarray) -> List[int]:
+        """
+        Iterative DeptFirstSearch: it gives the same tree of the recursive one, without the limits of the recursion
+        :param root: index of the region from which it starts
+        :param adjacency_i: for every region, its links
+        :param ends_i: indexes of the regions linked by every link
+        :return: links of the spanning tree
+        """
+        visited = {root}
+        tree_i = []
+        stack = [(root, iter(adjacency_i[root]))]
+        while len(stack) != 0:
+            node, links_i = stack[-1]
+            for link in links_i:
+                other = ends_i[link, 1] if ends_i[link, 0] == node else ends_i[link, 0]
+                if other not in visited:
+                    visited.add(other)
+                    tree_i.append(link)
+                    stack.append((other, iter(adjacency_i[other])))
+                    break
+            else:
+                stack.pop()
+        return tree_i
 
     m = Map(numColor)
 
@@ -204,44 +559,139 @@ def generateMap(n: int, *, numColor: int = 4, minimalCutsetSize: int = 1) -> Map
     for point in points:
         m.addRegion(point)
 
-    links = set()
-    while len(points) > 0:
-        point = points.pop()
-        orderedPoints = list(points)
-        orderedPoints.sort(key=lambda p_i: p_i.distance(point))
-        for p in orderedPoints:
-            if linkPossible(links, point, p):
-                links.add((point, p))
-                points.add(point)
-                break
-
-    edges = set()
-    setrecursionlimit(n*3)
-    _dfs(m.getRegions().pop(), set(), links, edges)
-    for edge in edges:
-        m.addBorder(edge[0], edge[1])
+    regions = points
+    coordinates = np.array([(p.x(), p.y()) for p in regions])
+    if fast:
+        kdTree = KDTree(coordinates)
+        links = _nearestLinks(regions, coordinates, kdTree)
+    else:
+        links = Links(regions)
+        remaining = set(range(n))
+        while len(remaining) > 0:
+            i = remaining.pop()
+            others = np.fromiter(remaining, dtype=np.intp, count=len(remaining))
+            distances = np.sqrt((coordinates[others, 0] - coordinates[i, 0])**2 + (coordinates[others, 1] - coordinates[i, 1])**2)
+            orderedPoints = others[np.argsort(distances, kind='stable')]
+            linked = False
+            for start in range(0, len(orderedPoints), 32):
+                block = orderedPoints[start:start + 32]
+                blocked = checkIntersectMany(regions[i], coordinates[block], links.around(regions[i])).any(axis=1)      # cheap test against the links around the point...
+                for j in block[~blocked]:
+                    if linkPossible(links, regions[i], regions[j]):     # ... before the complete one
+                        links.add(regions[i], regions[j])
+                        remaining.add(i)
+                        linked = True
+                        break
+                if linked:
+                    break
+
+    ends = links.getEnds()
+    adjacency: List[List[int]] = [[] for _ in range(n)]
+    for link in range(len(ends)):
+        adjacency[ends[link, 0]].append(link)
+        adjacency[ends[link, 1]].append(link)
+    tree = _dfs(0, adjacency, ends)      # the root is the region from which the cutset will start
+    edges = Links(regions)
+    for link in tree:
+        m.addBorder(regions[ends[link, 0]], regions[ends[link, 1]])
+        edges.add(regions[ends[link, 0]], regions[ends[link, 1]])
 
     cutset = []
-    ps = m.getRegions()
+    ps = regions[1:]
     for i in range(minimalCutsetSize):
         if len(cutset) == 0:
-            cutset.append(ps.pop())
+            cutset.append(regions[0])
         else:
             p = cutset.pop()
             v = None
-            for edge in edges:
-                if edge[0] is p and edge[1] not in cutset:
-                    v = edge[1]
-                if edge[1] is p and edge[0] not in cutset:
-                    v = edge[0]
+            for edge in edges.getEnds():
+                if edges.getPoint(edge[0]) is p and edges.getPoint(edge[1]) not in cutset:
+                    v = edges.getPoint(edge[1])
+                if edges.getPoint(edge[1]) is p and edges.getPoint(edge[0]) not in cutset:
+                    v = edges.getPoint(edge[0])
             cutset.append(p)
             cutset.append(v)
 
         actual = cutset[len(cutset)-1]
-        for reg in ps:
+        if fast:
+            candidates = [regions[j] for j in kdTree.query(actual.x(), actual.y(), _CUTSET_NEIGHBOURS + 1) if regions[j] is not actual]
+        else:
+            candidates = ps
+        for reg in candidates:
             if reg is not cutset:
                 if linkPossible(edges, actual, reg):
                     m.addBorder(actual, reg)
-                    edges.add((actual, reg))
+                    edges.add(actual, reg)
 
     return m
+
+
+_NEIGHBOURS = 8
+_CUTSET_NEIGHBOURS = 32
+
+
+def _nearestLinks(regions: List[Point], coordinates: np.ndarray, kdTree: KDTree) -> Links:
+    """
+    Links every point to all its linkable nearest neighbours, from the nearest, like generateMap does with all the points.
+    The links around a point are tested all at once: with cells wider than the candidate link plus the margin, every link that can cross it
+    is in the 3x3 cells around the point, so only the longer candidates need the complete test. Then the components left apart are joined
+    Execution time: O(n log n)
+    :param regions: points to link
+    :param coordinates: (n, 2) float array of the points
+    :param kdTree: KD-tree of the points
+    :return: links
+    """
+    n = len(regions)
+    neighbours = [kdTree.query(coordinates[i, 0], coordinates[i, 1], _NEIGHBOURS + 1)[1:] for i in range(n)]
+    lengths = np.array([sqrt((coordinates[i, 0] - coordinates[js[-1], 0])**2 + (coordinates[i, 1] - coordinates[js[-1], 1])**2) for i, js in enumerate(neighbours) if len(js) != 0])
+    reach = 2 * float(np.median(lengths)) if len(lengths) != 0 else 1.0
+    links = Links(regions, int(1 / (reach + SegmentIndex.margin)))
+    short = 1 / max(1, int(1 / (reach + SegmentIndex.margin))) - SegmentIndex.margin
+
+    for i in range(n):
+        a = regions[i]
+        candidates = np.array([j for j in neighbours[i] if (a, regions[j]) not in links], dtype=np.intp)
+        if len(candidates) == 0:
+            continue
+        blocked = checkIntersectMany(a, coordinates[candidates], links.around(a)).any(axis=1)
+        added = []
+        for j in candidates[~blocked]:
+            b = regions[j]
+            if sqrt((b.x() - a.x())**2 + (b.y() - a.y())**2) > short and not linkPossible(links, a, b):
+                continue
+            if len(added) != 0 and checkIntersectMany(a, b, np.array(added)).any():       # links added in this same step aren't in the test above
+                continue
+            links.add(a, b)
+            added.append((a.x(), a.y(), b.x(), b.y()))
+
+    # the nearest neighbours' graph can be disconnected: every component is linked to another one, looking for farther neighbours
+    component = list(range(n))
+
+    def find(i: int) -> int:
+        while component[i] != i:
+            component[i] = component[component[i]]
+            i = component[i]
+        return i
+
+    for i, j in links.getEnds().tolist():
+        component[find(i)] = find(j)
+    k = 2 * _NEIGHBOURS
+    while True:
+        members: Dict[int, List[int]] = {}
+        for i in range(n):
+            members.setdefault(find(i), []).append(i)
+        if len(members) == 1 or k > 2 * n:
+            break
+        for group in sorted(members.values(), key=len)[:-1]:        # every component but the biggest
+            joined = False
+            for i in group:
+                for j in kdTree.query(coordinates[i, 0], coordinates[i, 1], k):
+                    if find(j) != find(i) and linkPossible(links, regions[i], regions[j]):
+                        links.add(regions[i], regions[j])
+                        component[find(i)] = find(j)
+                        joined = True
+                        break
+                if joined:
+                    break
+        k *= 2
+    return links
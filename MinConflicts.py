@@ -0,0 +1,202 @@
+from typing import Tuple
+from timeit import default_timer as timer
+import random
+
+from TreeSolver import *
+
+
+def spanningForest(csp: CSP) -> List[CSP]:
+    """
+    Given a csp, it builds a spanning tree (by BFS) of every connected component of its constraint graph, as a csp with the
+    component's variables and unary constraints but only the binary constraints of the tree
+    Execution time: O(n+e) e=number of constraints
+    :param csp: csp of interest
+    :return: list of tree-like csp, one for every connected component
+    """
+    trees = []
+    visited: Set[Variable] = set()
+    for start in sorted(csp.getVariables(), key=lambda var: var.getName()):
+        if start in visited:
+            continue
+        tree = CSP()
+        tree.addVariable(start)
+        visited.add(start)
+        queue = [start]
+        for var in queue:       # the queue grows while it is visited
+            for value, constraints in csp.getUnaryConstraintsForVar(var).items():
+                tree.addUnaryConstraint(var, constraints[0], value)
+            for var2, constraint in csp.getBinaryConstraintsForVar(var).items():
+                if var2 not in visited:
+                    visited.add(var2)
+                    queue.append(var2)
+                    tree.addVariable(var2)
+                    tree.addBinaryConstraint(var, constraint, var2)
+        trees.append(tree)
+    return trees
+
+
+def minConflicts(csp: CSP, maxSteps: int = 100000, seed: Optional[int] = None, *, tabu: int = 10, noise: float = 0.05, spanningTree: bool = False,
+                 stats: SolverStats = None) -> Assignment:
+    """
+    Local search for a complete assignment: at every step a random conflicted variable takes the value with the fewest conflicts
+    (or, with probability noise, a random one). The conflicts of every (variable, value) are kept in a flat array, updated
+    incrementally after every move only for the neighbours of the moved variable, and a value just left is tabu for some steps.
+    It isn't complete: it can't prove that a csp is unsatisfiable, unless its domains or a spanning tree already are
+    Execution time: O(maxSteps * g(d + c)) g=max degree, c=max conflicting values of a neighbour's value
+    :param csp: csp of interest
+    :param maxSteps: maximum number of steps
+    :param seed: seed of the random choices; if None, the search isn't reproducible
+    :param tabu: number of steps for which a variable can't go back to the value it left (unless that value has no conflict)
+    :param noise: probability of a random-walk step
+    :param spanningTree: if True the search starts from a solution of a spanning tree of every connected component (found by
+        treeSolver), if False from random values
+    :param stats: statistics to update (time in phase 'localSearch', one node for every move); if None, nothing is counted
+    :return: an assignment, null if no solution has been found in maxSteps steps (or if the csp is unsatisfiable)
+    """
+    def nullAssignment() -> Assignment:
+        if stats is not None:
+            stats.addTime('localSearch', timer() - start)
+            stats.exitPhase('localSearch')
+        null = Assignment()
+        null.setNull()
+        return null
+
+    if stats is not None:
+        start = timer()
+        stats.enterPhase('localSearch')
+    rng = random.Random(seed)
+
+    # Compiling: every variable gets an index, its domain a list of values (the ones respecting unary constraints and self-loops)
+    variables = sorted(csp.getVariables(), key=lambda var: var.getName())
+    index = {var: i for i, var in enumerate(variables)}
+    shared: Dict[tuple, List[Any]] = {}         # variables with the same values share the list, and so the tables of the constraints
+    domains = []
+    offsets = []
+    size = 0
+    for var in variables:
+        unaryConstraints = list(csp.getUnaryConstraintsForVar(var).items())
+        binaryConstraints = csp.getBinaryConstraintsForVar(var)
+        selfLoop = binaryConstraints[var] if var in binaryConstraints else None
+        values = [value for value in sorted(var.getActualDomain(), key=repr)
+                  if all(constraints[0](value, v) for v, constraints in unaryConstraints) and (selfLoop is None or selfLoop(value, value))]
+        if len(values) == 0:        # an empty domain: the csp is unsatisfiable
+            return nullAssignment()
+        domains.append(shared.setdefault(tuple(values), values))
+        offsets.append(size)
+        size += len(values)
+
+    # For every neighbour i of a variable j, tables[b] lists the values of i conflicting with the value b of j
+    tables: Dict[tuple, List[List[int]]] = {}
+    neighbours: List[List[Tuple[int, List[List[int]]]]] = []
+    for j, var in enumerate(variables):
+        adjacent = []
+        for var2, constraint in csp.getBinaryConstraintsForVar(var).items():
+            if var2 is var:
+                continue
+            i = index[var2]
+            key = (constraint, id(domains[j]), id(domains[i]))
+            if key not in tables:
+                tables[key] = [[a for a, valueA in enumerate(domains[i]) if not constraint(valueB, valueA)] for valueB in domains[j]]
+            adjacent.append((i, tables[key]))
+        neighbours.append(adjacent)
+
+    # Starting assignment
+    current = [0] * len(variables)
+    if spanningTree:
+        for tree in spanningForest(csp):
+            treeDomains = Domains(tree.getVariables())        # the compiled domains: DAC doesn't look at unary constraints
+            for var in tree.getVariables():
+                for value in var.getActualDomain().difference(domains[index[var]]):
+                    treeDomains.hideValue(var, value)
+            treeAssignment = treeSolver(tree, treeDomains, stats)
+            if treeAssignment.isNull():     # a relaxation of the csp is unsatisfiable
+                return nullAssignment()
+            for var, value in treeAssignment.getAssignment().items():
+                i = index[var]
+                current[i] = domains[i].index(value)
+    else:
+        for i in range(len(variables)):
+            current[i] = rng.randrange(len(domains[i]))
+
+    conflicts = [0] * size      # conflicts[offsets[i] + a]: number of neighbours of i conflicting with its value a
+    for j, adjacent in enumerate(neighbours):
+        b = current[j]
+        for i, table in adjacent:
+            offset = offsets[i]
+            for a in table[b]:
+                conflicts[offset + a] += 1
+    conflicted = [i for i in range(len(variables)) if conflicts[offsets[i] + current[i]] != 0]      # kept with positions, for O(1) changes and random choice
+    position = [-1] * len(variables)
+    for k, i in enumerate(conflicted):
+        position[i] = k
+    tabuUntil = [0] * size
+
+    def update(i_i: int) -> None:
+        """
+        Adds a variable to the conflicted ones or removes it, following the conflicts of its value
+        :param i_i: index of the variable
+        """
+        if conflicts[offsets[i_i] + current[i_i]] != 0:
+            if position[i_i] == -1:
+                position[i_i] = len(conflicted)
+                conflicted.append(i_i)
+        elif position[i_i] != -1:
+            last = conflicted.pop()
+            if last != i_i:
+                conflicted[position[i_i]] = last
+                position[last] = position[i_i]
+            position[i_i] = -1
+
+    for step in range(maxSteps):
+        if len(conflicted) == 0:
+            break
+        j = conflicted[rng.randrange(len(conflicted))]
+        offset = offsets[j]
+        d = len(domains[j])
+        old = current[j]
+        if d == 1:
+            continue
+        if rng.random() < noise:        # random walk
+            new = rng.randrange(d - 1)
+            if new >= old:
+                new += 1
+        else:       # the fewest conflicts, among the values not tabu (or without conflicts)
+            best = []
+            fewest = -1
+            for a in range(d):
+                count = conflicts[offset + a]
+                if tabuUntil[offset + a] > step and count != 0:
+                    continue
+                if fewest == -1 or count < fewest:
+                    fewest = count
+                    best = [a]
+                elif count == fewest:
+                    best.append(a)
+            if len(best) == 0:
+                continue
+            new = best[rng.randrange(len(best))]
+            if new == old:
+                continue
+
+        if stats is not None:
+            stats.nodes += 1
+        current[j] = new
+        tabuUntil[offset + old] = step + 1 + tabu
+        for i, table in neighbours[j]:      # only the neighbours' conflicts change
+            offsetI = offsets[i]
+            for a in table[old]:
+                conflicts[offsetI + a] -= 1
+            for a in table[new]:
+                conflicts[offsetI + a] += 1
+            update(i)
+        update(j)
+
+    if len(conflicted) != 0:
+        return nullAssignment()
+    assignment = Assignment(variables)
+    for i, var in enumerate(variables):
+        assignment.addVarAssigned(var, domains[i][current[i]])
+    if stats is not None:
+        stats.addTime('localSearch', timer() - start)
+        stats.exitPhase('localSearch')
+    return assignment
@@ -0,0 +1,217 @@
+import itertools
+import json
+import os
+import random
+import tempfile
+from typing import Callable, Dict, List, Tuple
+from timeit import default_timer as timer
+
+from Benchmark import *
+from Domains import Domains
+from Example import australia, italy, example6
+from Instances import readXCSP
+from TreeSolver import batchTreeSolver, treeSolver
+
+
+class RegressionError(Exception):
+    pass
+
+
+REGRESSION_DIRECTORY = 'regression'
+BASELINE = os.path.join(REGRESSION_DIRECTORY, 'baseline.json')
+REGRESSION_SOLVERS = ['backtrack', 'cutset']
+METRICS = ['time', 'checks', 'nodes']
+# maximum relative increase from the baseline. Ties in the variables' order and the order of the edges in AC3/MAC depend on
+# the iteration order of sets of Variables, which changes from a run to another: so every metric is the minimum of several runs,
+# that is far more stable than the median (e.g. cutset on example6(40) takes 37 or 109 nodes depending on the ties)
+THRESHOLDS = {'time': 1.0, 'checks': 0.25, 'nodes': 0.25}
+TIME_FLOOR = 0.002      # differences of time smaller than this (seconds) are never a regression
+
+REPEATED_SCOPE_XCSP = """<instance>
+<domains nbDomains="1"><domain name="D0" nbValues="3">0..2</domain></domains>
+<variables nbVariables="2"><variable name="X" domain="D0"/><variable name="Y" domain="D0"/></variables>
+<relations nbRelations="2">
+<relation name="R0" arity="2" nbTuples="3" semantics="conflicts">0 0|1 1|2 2</relation>
+<relation name="R1" arity="2" nbTuples="1" semantics="supports">%s</relation>
+</relations>
+<constraints nbConstraints="2">
+<constraint name="C0" arity="2" scope="X Y" reference="R0"/>
+<constraint name="C1" arity="2" scope="%s" reference="R1"/>
+</constraints>
+</instance>
+"""
+
+
+def checkRepeatedScope() -> bool:
+    """
+    Solves an XCSP instance with two constraints on the same couple of variables (once with the same scope, once with the reversed one):
+    both must hold, so the only solution is X=0, Y=2
+    :return: True if the solution is the right one
+    """
+    for tuples, scope in (('0 2', 'X Y'), ('2 0', 'Y X')):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'repeated.xml')
+            with open(path, 'w') as file:
+                file.write(REPEATED_SCOPE_XCSP % (tuples, scope))
+            csp = readXCSP(path)
+        solution = backtrack(csp)
+        if solution.isNull() or {var.getName(): value for var, value in solution.getAssignment().items()} != {'X': 0, 'Y': 2}:
+            return False
+    return True
+
+
+def checkBatchTreeSolver() -> bool:
+    """
+    Solves a random tree with batchTreeSolver for every combination of values of some boundary variables, and compares
+    every instance with treeSolver on the domains restricted to the same values
+    :return: True if the satisfiability of every instance is the same and every assignment of the batch is a solution of its instance
+    """
+    generator = random.Random(0)
+    values = list(range(4))
+    csp = CSP()
+    variables = [Variable(str(i), values) for i in range(30)]
+    for i, var in enumerate(variables):
+        csp.addVariable(var)
+        if i != 0:
+            csp.addBinaryConstraint(variables[generator.randrange(i)], Constraint(generator.choice([different, different, greater])), var)
+    boundary = generator.sample(variables, 3)
+    combinations = list(itertools.product(values, repeat=len(boundary)))
+    masks = {var: np.array([[value == combination[j] for value in values] for combination in combinations]) for j, var in enumerate(boundary)}
+    satisfiable, assignments = batchTreeSolver(csp, values, masks)
+
+    for b, combination in enumerate(combinations):
+        domains = Domains(csp.getVariables())
+        for var, value in zip(boundary, combination):
+            for other in values:
+                if other != value:
+                    domains.hideValue(var, other)
+        if satisfiable[b] == treeSolver(csp, domains).isNull():
+            return False
+        if satisfiable[b] and (not csp.verifyMany([assignments[b]], complete=True)[0] or
+                               any(assignments[b].getValue(var) != value for var, value in zip(boundary, combination))):
+            return False
+    return bool(satisfiable.any() and not satisfiable.all())     # the batch must have both kinds of instances
+
+
+# checks of the correctness of the solvers, run before the suite
+CHECKS: List[Tuple[str, Callable[[], bool]]] = [('repeated XCSP scope', checkRepeatedScope),
+                                                ('batchTreeSolver and treeSolver', checkBatchTreeSolver)]
+
+
+def checkCorrectness(*, verbose: bool = True) -> List[str]:
+    """
+    Runs every check of CHECKS
+    :param verbose: if True the result of every check is printed
+    :return: description of every failed check (empty if there isn't any)
+    """
+    failures = []
+    for name, check in CHECKS:
+        passed = check()
+        if not passed:
+            failures.append(name + ': FAILED')
+        if verbose:
+            print(name, 'ok' if passed else 'FAILED')
+    return failures
+
+
+def cases(directory: str = REGRESSION_DIRECTORY) -> List[Tuple[str, Callable[[], CSP]]]:
+    """
+    Instances of the suite: the examples and the maps stored in the directory (generated the first time, then always the same)
+    :param directory: directory of the maps
+    :return: list of (name of the case, function that builds a new csp)
+    """
+    corpus = Corpus(directory)
+    suite = [('australia', australia), ('italy', italy)]
+    for n in (10, 20, 40):
+        suite.append(('example6-' + str(n), lambda n_i=n: example6(n_i)))
+    for n in (50, 100, 200):
+        suite.append(('map-' + str(n), corpus.get(n, seed=0).toCSP))
+    return suite
+
+
+def measureCase(solver: str, build: Callable[[], CSP], *, repeats: int = 9) -> Dict[str, float]:
+    """
+    Runs a solver on a case: every run solves a new CSP with the random generator seeded in the same way,
+    and the minimum of the runs is taken for every metric. Constraint checks and search nodes are the ones of SolverStats
+    :param solver: name of the solver, a key of SOLVERS
+    :param build: function that builds a new csp of the case
+    :param repeats: number of runs
+    :return: wall time (seconds), constraint checks and search nodes
+    """
+    times, checks, nodes = [], [], []
+    for run in range(repeats):
+        csp = build()
+        random.seed(run)
+        start = timer()
+        SOLVERS[solver](csp)
+        end = timer()
+        times.append(end - start)
+
+        csp = build()       # counted in a run apart, so the statistics don't change the time
+        random.seed(run)
+        stats = SolverStats()
+        SOLVERS[solver](csp, stats)
+        checks.append(stats.checks)
+        nodes.append(stats.nodes)
+    return {'time': min(times), 'checks': min(checks), 'nodes': min(nodes)}
+
+
+def runSuite(*, repeats: int = 9, directory: str = REGRESSION_DIRECTORY) -> Dict[str, Dict[str, float]]:
+    """
+    :param repeats: number of runs of every case
+    :param directory: directory of the maps
+    :return: metrics of every case and solver, by "case/solver"
+    """
+    results = {}
+    for name, build in cases(directory):
+        for solver in REGRESSION_SOLVERS:
+            results[name + '/' + solver] = measureCase(solver, build, repeats=repeats)
+    return results
+
+
+def updateBaseline(path: str = BASELINE, *, repeats: int = 9) -> Dict[str, Dict[str, float]]:
+    """
+    Runs the suite and saves the results as the new baseline
+    :param path: path of the baseline file
+    :param repeats: number of runs of every case
+    :return: results
+    """
+    results = runSuite(repeats=repeats, directory=os.path.dirname(path) or '.')
+    with open(path, 'w') as file:
+        json.dump({'version': 1, 'repeats': repeats, 'results': results}, file, indent=1, sort_keys=True)
+    return results
+
+
+def checkBaseline(path: str = BASELINE, *, thresholds: Dict[str, float] = None, repeats: int = 9, verbose: bool = True) -> List[str]:
+    """
+    Runs the suite and compares every metric with the baseline: a metric regresses if it is bigger than the baseline by more than its threshold
+    :param path: path of the baseline file
+    :param thresholds: maximum relative increase of every metric (e.g. 0.1 is 10%); the missing ones are taken from THRESHOLDS
+    :param repeats: number of runs of every case
+    :param verbose: if True every comparison is printed
+    :return: description of every regression (empty if there isn't any)
+    :raise RegressionError: if the baseline file doesn't exist or isn't valid
+    """
+    if not os.path.exists(path):
+        raise RegressionError
+    with open(path) as file:
+        baseline = json.load(file)
+    if baseline.get('version') != 1:
+        raise RegressionError
+    limits = dict(THRESHOLDS)
+    limits.update(thresholds or {})
+
+    regressions = []
+    results = runSuite(repeats=repeats, directory=os.path.dirname(path) or '.')
+    for key in sorted(results):
+        if key not in baseline['results']:
+            continue
+        for metric in METRICS:
+            old, new = baseline['results'][key][metric], results[key][metric]
+            change = (new - old) / old if old != 0 else (0.0 if new == 0 else float('inf'))
+            regressed = change > limits[metric] and (metric != 'time' or new - old > TIME_FLOOR)
+            if regressed:
+                regressions.append(key + ' ' + metric + ': ' + '%g' % old + ' -> ' + '%g' % new + ' (+' + '%.1f' % (100 * change) + '%)')
+            if verbose:
+                print(key, metric, '%g' % old, '->', '%g' % new, '(%+.1f%%)' % (100 * change), 'REGRESSION' if regressed else '')
+    return regressions
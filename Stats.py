@@ -0,0 +1,192 @@
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from Constraints import Constraint
+
+
+class MemoryProfile:
+    """
+    This class represent the memory used by a solver's run, measured with tracemalloc: the peak of the traced memory in every
+    phase (a phase nested in another one counts for both) and the allocation sites whose memory grew the most during it (memory
+    still allocated at the end of the phase, summed over every time the phase is run). It is enabled by giving it to SolverStats;
+    tracing slows the solver down a lot, so times measured with it aren't meaningful
+    """
+    def __init__(self, top: int = 10):
+        """
+        :param top: number of allocation sites kept for every phase
+        """
+        self.top = top
+        self.peak = 0           # bytes, peak of the traced memory during the whole run
+        self.peaks: Dict[str, int] = {}         # bytes, peak of the traced memory in every phase
+        self.sites: Dict[str, Dict[str, int]] = {}      # bytes allocated by every site ('file:line') in every phase
+        self._stack: List[Tuple[str, List[int], Dict[str, int]]] = []      # phases entered: name, peak so far, memory by site at the start
+        self._started = False
+        self._base = 0
+
+    def start(self) -> None:
+        """
+        Starts tracing the allocations (if they aren't traced yet); memory allocated before isn't counted in the peaks
+        """
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._base = tracemalloc.get_traced_memory()[0]
+
+    def stop(self) -> None:
+        """
+        Stops tracing the allocations, if start has started it
+        """
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1] - self._base)
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    def _sites(self) -> Dict[str, int]:
+        """
+        :return: memory allocated by every site, except the profiler itself
+        """
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+        return {str(statistic.traceback[0]): statistic.size for statistic in snapshot.statistics('lineno')}
+
+    def enter(self, phase: str) -> None:
+        """
+        Starts measuring a phase (nothing is measured if tracemalloc isn't tracing)
+        :param phase: name of the phase
+        """
+        if not tracemalloc.is_tracing():
+            return
+        peak = tracemalloc.get_traced_memory()[1] - self._base
+        if len(self._stack) != 0:       # the peak of the outer phase until now is lost by reset_peak
+            self._stack[-1][1][0] = max(self._stack[-1][1][0], peak)
+        self.peak = max(self.peak, peak)
+        self._stack.append((phase, [0], self._sites() if self.top > 0 else {}))
+        tracemalloc.reset_peak()
+
+    def exit(self, phase: str) -> None:
+        """
+        Ends measuring a phase
+        :param phase: name of the phase, the last one entered
+        """
+        if not tracemalloc.is_tracing() or len(self._stack) == 0 or self._stack[-1][0] != phase:
+            return
+        peak = tracemalloc.get_traced_memory()[1] - self._base
+        _, innerPeak, startSites = self._stack.pop()
+        peak = max(peak, innerPeak[0])
+        self.peaks[phase] = max(self.peaks.get(phase, 0), peak)
+        self.peak = max(self.peak, peak)
+        if len(self._stack) != 0:
+            self._stack[-1][1][0] = max(self._stack[-1][1][0], peak)
+        if self.top > 0:
+            sites = self.sites.setdefault(phase, {})
+            for site, size in self._sites().items():
+                growth = size - startSites.get(site, 0)
+                if growth > 0:
+                    sites[site] = sites.get(site, 0) + growth
+        tracemalloc.reset_peak()
+
+    def topSites(self, phase: str) -> List[Tuple[str, int]]:
+        """
+        :param phase: name of the phase
+        :return: the top allocation sites of the phase, as (site, bytes), from the largest
+        """
+        return sorted(self.sites.get(phase, {}).items(), key=lambda site: -site[1])[:self.top]
+
+    def toDict(self) -> Dict[str, Any]:
+        """
+        :return: the peak and, for every phase, its peak and top allocation sites
+        """
+        return {'peak': self.peak, 'phases': {phase: {'peak': peak, 'sites': self.topSites(phase)} for phase, peak in self.peaks.items()}}
+
+    def printProfile(self) -> None:
+        """
+        Prints the profile
+        """
+        print('peak memory: ' + '%.1f' % (self.peak / 1024) + ' KiB')
+        for phase, peak in self.peaks.items():
+            print('peak memory in ' + phase + ': ' + '%.1f' % (peak / 1024) + ' KiB')
+            for site, size in self.topSites(phase):
+                print('    ' + site + ': ' + '%.1f' % (size / 1024) + ' KiB')
+
+
+class SolverStats:
+    """
+    This class represent the statistics of a solver's run. Solvers accept an optional SolverStats and, when it is None,
+    they skip every count, so there is no overhead when statistics are disabled.
+    Constraint checks are counted by wrapping the constraint once per revision (see countChecks), not with a test for every check.
+    With a MemoryProfile, the memory of every phase is measured too
+    """
+    def __init__(self, memory: Optional[MemoryProfile] = None):
+        """
+        :param memory: profile of the memory to update, if it has been started; if None, memory isn't measured
+        """
+        self.nodes = 0              # values tried for a variable during search
+        self.backtracks = 0         # search nodes whose values all failed
+        self.macCalls = 0
+        self.revisions = 0          # arc revisions (AC3, MAC, DAC)
+        self.checks = 0             # constraint checks
+        self.pruned = 0             # values removed from a domain by inference
+        self.treeTests = 0          # isATree calls
+        self.treeSolves = 0
+        self.phases: Dict[str, float] = {}      # seconds spent in every phase (e.g. 'ac3', 'search', 'treeSolve')
+        self.memory = memory
+
+    def countChecks(self, constraint: Constraint) -> Callable[[Any, Any], bool]:
+        """
+        :param constraint: constraint to check
+        :return: function that checks the constraint, counting every call
+        """
+        def counted(value1, value2) -> bool:
+            self.checks += 1
+            return constraint(value1, value2)
+        return counted
+
+    def addTime(self, phase: str, seconds: float) -> None:
+        """
+        Adds time spent in a phase
+        :param phase: name of the phase
+        :param seconds: time spent
+        :return: None
+        """
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def enterPhase(self, phase: str) -> None:
+        """
+        Marks the start of a phase, for the memory profile
+        :param phase: name of the phase
+        :return: None
+        """
+        if self.memory is not None:
+            self.memory.enter(phase)
+
+    def exitPhase(self, phase: str) -> None:
+        """
+        Marks the end of a phase, for the memory profile
+        :param phase: name of the phase
+        :return: None
+        """
+        if self.memory is not None:
+            self.memory.exit(phase)
+
+    def toDict(self) -> Dict[str, Any]:
+        """
+        :return: every statistic by name (phases as a nested dict, and the memory profile, if any)
+        """
+        result = {'nodes': self.nodes, 'backtracks': self.backtracks, 'macCalls': self.macCalls, 'revisions': self.revisions, 'checks': self.checks,
+                'pruned': self.pruned, 'treeTests': self.treeTests, 'treeSolves': self.treeSolves,
+                'phases': dict(self.phases)}
+        if self.memory is not None:
+            result['memory'] = self.memory.toDict()
+        return result
+
+    def printStats(self) -> None:
+        """
+        Prints the statistics
+        """
+        for name, value in self.toDict().items():
+            if name != 'phases':
+                print(name + ': ' + str(value))
+        for phase, seconds in self.phases.items():
+            print('time in ' + phase + ': ' + '%.6f' % seconds)
+        if self.memory is not None:
+            self.memory.printProfile()
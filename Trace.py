@@ -0,0 +1,212 @@
+import json
+import struct
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, TextIO, Tuple
+from timeit import default_timer as timer
+
+from Variable import Variable
+
+
+class TraceError(Exception):
+    pass
+
+
+class SearchHooks:
+    """
+    This class represent the receiver of the events of a search (backtrack and cutset accept it as "hooks"); every method does nothing,
+    so a subclass can override only the events it needs. When no hooks are passed, the solvers skip every event.
+    The depth of an event is the number of variables assigned when it happens
+    """
+    def assign(self, var: Variable, value: Any, depth: int) -> None:
+        """
+        A value has been assigned to a variable (a new search node)
+        """
+
+    def undo(self, var: Variable, value: Any, depth: int) -> None:
+        """
+        The value assigned to a variable has been discarded: its node and the subtree under it failed
+        """
+
+    def prune(self, var: Variable, value: Any, depth: int) -> None:
+        """
+        MAC has removed a value from the domain of a variable
+        """
+
+    def wipeout(self, var: Variable, depth: int) -> None:
+        """
+        MAC has emptied the domain of a variable
+        """
+
+    def backtrack(self, var: Variable, depth: int) -> None:
+        """
+        Every value of a variable failed: the search goes back
+        """
+
+    def treeSolveStart(self, size: int, depth: int) -> None:
+        """
+        The tree left by the cutset (of size variables) is going to be solved
+        """
+
+    def treeSolveEnd(self, solved: bool, depth: int) -> None:
+        """
+        The tree has been solved (or found unsatisfiable)
+        """
+
+    def close(self) -> None:
+        """
+        Ends the trace
+        """
+
+
+class ChromeTraceWriter(SearchHooks):
+    """
+    This class represent a streaming writer of Chrome trace-event JSON (chrome://tracing, Perfetto): every event is written as soon as it happens.
+    Every assigned value is a slice that lasts until it is undone, so nested slices draw the search tree; tree solves are slices too,
+    prunes, wipeouts and backtracks are instant events
+    """
+    def __init__(self, file: TextIO):
+        """
+        :param file: text file opened for writing
+        """
+        self._file = file
+        self._start = timer()
+        self._open = 0      # slices not yet ended
+        self._file.write('[\n')
+        self._first = True
+
+    def _write(self, event: Dict[str, Any]) -> None:
+        event['ts'] = (timer() - self._start) * 1e6
+        event['pid'] = 1
+        event['tid'] = 1
+        self._file.write(('' if self._first else ',\n') + json.dumps(event))
+        self._first = False
+
+    def assign(self, var: Variable, value: Any, depth: int) -> None:
+        self._open += 1
+        self._write({'name': var.getName() + ' = ' + str(value), 'ph': 'B', 'args': {'depth': depth}})
+
+    def undo(self, var: Variable, value: Any, depth: int) -> None:
+        self._open -= 1
+        self._write({'name': var.getName() + ' = ' + str(value), 'ph': 'E'})
+
+    def prune(self, var: Variable, value: Any, depth: int) -> None:
+        self._write({'name': 'prune', 'ph': 'i', 's': 't', 'args': {'var': var.getName(), 'value': str(value), 'depth': depth}})
+
+    def wipeout(self, var: Variable, depth: int) -> None:
+        self._write({'name': 'wipeout', 'ph': 'i', 's': 't', 'args': {'var': var.getName(), 'depth': depth}})
+
+    def backtrack(self, var: Variable, depth: int) -> None:
+        self._write({'name': 'backtrack', 'ph': 'i', 's': 't', 'args': {'var': var.getName(), 'depth': depth}})
+
+    def treeSolveStart(self, size: int, depth: int) -> None:
+        self._open += 1
+        self._write({'name': 'treeSolve', 'ph': 'B', 'args': {'size': size, 'depth': depth}})
+
+    def treeSolveEnd(self, solved: bool, depth: int) -> None:
+        self._open -= 1
+        self._write({'name': 'treeSolve', 'ph': 'E', 'args': {'solved': solved}})
+
+    def close(self) -> None:
+        """
+        Ends the slices still open (the path to the solution) and the JSON array
+        """
+        while self._open > 0:
+            self._open -= 1
+            self._write({'ph': 'E'})
+        self._file.write('\n]\n')
+        self._file.flush()
+
+
+# binary log: a record for every event, with its type, time, variable, value and depth; a variable or a value is written as
+# an id, defined by a name record the first time it appears
+_EVENTS = ['assign', 'undo', 'prune', 'wipeout', 'backtrack', 'treeSolveStart', 'treeSolveEnd']
+_VARIABLE_NAME = 254
+_VALUE_NAME = 255
+_EVENT_RECORD = struct.Struct('<Bdiii')       # type, seconds from the start, variable id (-1 if none), value id (or size/solved), depth
+_NAME_RECORD = struct.Struct('<BiI')          # type, id, length of the utf-8 name that follows
+_MAGIC = b'CSPTRACE\x01'
+
+
+class BinaryTraceWriter(SearchHooks):
+    """
+    This class represent a streaming writer of a compact binary log of the search (21 bytes per event), to be read back by readBinaryTrace
+    """
+    def __init__(self, file: BinaryIO):
+        """
+        :param file: binary file opened for writing
+        """
+        self._file = file
+        self._start = timer()
+        self._variables: Dict[Variable, int] = {}
+        self._values: Dict[Any, int] = {}
+        self._file.write(_MAGIC)
+
+    def _id(self, table: dict, key: Any, name: str, kind: int) -> int:
+        if key not in table:
+            table[key] = len(table)
+            encoded = name.encode('utf-8')
+            self._file.write(_NAME_RECORD.pack(kind, table[key], len(encoded)) + encoded)
+        return table[key]
+
+    def _write(self, event: str, var: Optional[Variable], value: int, depth: int) -> None:
+        varID = -1 if var is None else self._id(self._variables, var, var.getName(), _VARIABLE_NAME)
+        self._file.write(_EVENT_RECORD.pack(_EVENTS.index(event), timer() - self._start, varID, value, depth))
+
+    def _valueID(self, value: Any) -> int:
+        return self._id(self._values, (type(value), value), repr(value), _VALUE_NAME)
+
+    def assign(self, var: Variable, value: Any, depth: int) -> None:
+        self._write('assign', var, self._valueID(value), depth)
+
+    def undo(self, var: Variable, value: Any, depth: int) -> None:
+        self._write('undo', var, self._valueID(value), depth)
+
+    def prune(self, var: Variable, value: Any, depth: int) -> None:
+        self._write('prune', var, self._valueID(value), depth)
+
+    def wipeout(self, var: Variable, depth: int) -> None:
+        self._write('wipeout', var, -1, depth)
+
+    def backtrack(self, var: Variable, depth: int) -> None:
+        self._write('backtrack', var, -1, depth)
+
+    def treeSolveStart(self, size: int, depth: int) -> None:
+        self._write('treeSolveStart', None, size, depth)
+
+    def treeSolveEnd(self, solved: bool, depth: int) -> None:
+        self._write('treeSolveEnd', None, int(solved), depth)
+
+    def close(self) -> None:
+        self._file.flush()
+
+
+def readBinaryTrace(file: BinaryIO) -> Iterator[Tuple[str, float, Optional[str], Any, int]]:
+    """
+    Reads a binary log written by BinaryTraceWriter, one event at a time
+    :param file: binary file opened for reading
+    :return: generator of (event, seconds from the start, variable's name or None, value (repr) or size/solved, depth)
+    :raise TraceError: if the file isn't a trace or it is truncated
+    """
+    if file.read(len(_MAGIC)) != _MAGIC:
+        raise TraceError
+    variables: List[str] = []
+    values: List[str] = []
+    while True:
+        kind = file.read(1)
+        if len(kind) == 0:
+            return
+        if kind[0] in (_VARIABLE_NAME, _VALUE_NAME):
+            header = kind + file.read(_NAME_RECORD.size - 1)
+            if len(header) != _NAME_RECORD.size:
+                raise TraceError
+            _, id, length = _NAME_RECORD.unpack(header)
+            name = file.read(length).decode('utf-8')
+            (variables if kind[0] == _VARIABLE_NAME else values).append(name)
+            continue
+        record = kind + file.read(_EVENT_RECORD.size - 1)
+        if len(record) != _EVENT_RECORD.size or kind[0] >= len(_EVENTS):
+            raise TraceError
+        event, seconds, varID, value, depth = _EVENT_RECORD.unpack(record)
+        event = _EVENTS[event]
+        if event in ('assign', 'undo', 'prune'):
+            value = values[value]
+        yield event, seconds, None if varID == -1 else variables[varID], value, depth
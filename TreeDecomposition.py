@@ -0,0 +1,165 @@
+from typing import Tuple
+
+from AC3 import AC3
+from CSP import *
+from Domains import Domains
+from Stats import SolverStats
+
+
+def eliminationOrder(csp: CSP, *, minFill: bool = True) -> List[Variable]:
+    """
+    Given a csp, it finds an elimination order of its variables for the constraint graph, choosing greedily at every step the variable that adds
+    the fewest fill edges (min-fill) or that has the fewest neighbours (min-degree)
+    Execution time: O(n^2 w^2) w=width found
+    :param csp: csp of interest
+    :param minFill: if True the order is chosen by min-fill, if False by min-degree
+    :return: elimination order
+    """
+    def fill(var_i: Variable) -> int:
+        """
+        :param var_i: variable to eliminate
+        :return: number of edges to add between its neighbours to make them a clique
+        """
+        neighbours_i = list(graph[var_i])
+        count = 0
+        for i in range(len(neighbours_i)):
+            for j in range(i + 1, len(neighbours_i)):
+                if neighbours_i[j] not in graph[neighbours_i[i]]:
+                    count += 1
+        return count
+
+    graph: Dict[Variable, Set[Variable]] = {}
+    for var in csp.getVariables():
+        graph[var] = set(csp.getBinaryConstraintsForVar(var)) - {var}
+
+    order = []
+    while len(graph) != 0:
+        if minFill:
+            var = min(graph, key=lambda v: (fill(v), len(graph[v])))
+        else:
+            var = min(graph, key=lambda v: len(graph[v]))
+        neighbours = graph.pop(var)
+        for var2 in neighbours:         # the neighbours become a clique...
+            graph[var2].discard(var)
+            graph[var2] |= neighbours - {var2}
+        order.append(var)       # ... and the variable is eliminated
+    return order
+
+
+def treeDecomposition(csp: CSP, *, minFill: bool = True) -> Tuple[List[List[Variable]], List[int], int]:
+    """
+    Given a csp, it builds a tree decomposition (join tree) of its constraint graph from an elimination order.
+    The bag of a variable contains it and its neighbours not yet eliminated; its parent is the bag of the first of them to be eliminated
+    :param csp: csp of interest
+    :param minFill: if True the elimination order is chosen by min-fill, if False by min-degree
+    :return: the bags, for every bag the index of its parent (-1 for a root) and the width of the decomposition
+    """
+    order = eliminationOrder(csp, minFill=minFill)
+    position = {var: i for i, var in enumerate(order)}
+    graph: Dict[Variable, Set[Variable]] = {}
+    for var in order:
+        graph[var] = set(csp.getBinaryConstraintsForVar(var)) - {var}
+
+    bags = []
+    parents = []
+    width = 0
+    for var in order:
+        neighbours = graph[var]
+        for var2 in neighbours:     # adds the fill edges
+            graph[var2].discard(var)
+            graph[var2] |= neighbours - {var2}
+        bags.append([var] + list(neighbours))
+        if len(neighbours) != 0:
+            parents.append(min(position[var2] for var2 in neighbours))
+        else:
+            parents.append(-1)
+        width = max(width, len(neighbours))
+    return bags, parents, width
+
+
+def treeDecompositionSolver(csp: CSP, *, minFill: bool = True, domains: Domains = None, stats: SolverStats = None) -> Tuple[Assignment, int]:
+    """
+    Given a csp, find a possible assignment solving it on a tree decomposition: every bag is solved by enumeration and
+    the join tree is solved like a tree-like csp, doing directional arc consistency from the leaves to the roots and then assigning the bags
+    Execution time: O(nd^(w+1)) w=width found
+    :param csp: csp of interest
+    :param minFill: if True the elimination order is chosen by min-fill, if False by min-degree
+    :param domains: store of the actual domains to prune; if None, a local copy is used and the csp's variables are left untouched
+    :param stats: statistics of the initial AC-3 to update; if None, nothing is counted
+    :return: assignment that satisfies the csp, eventually null if it is unsatisfiable, and the width of the decomposition
+    """
+    def bagSolutions(bag_i: List[Variable]) -> List[tuple]:
+        """
+        Enumerates all the assignments of a bag's variables consistent with the constraints inside the bag
+        :param bag_i: variables of the bag
+        :return: list of tuple of values, following the bag order
+        """
+        solutions = []
+        candidates = []
+        for var_i in bag_i:
+            unaryConstraints = csp.getUnaryConstraintsForVar(var_i)
+            candidates.append([value_i for value_i in domains.getActualDomain(var_i) if all(unaryConstraints[v][0](value_i, v) for v in unaryConstraints)])
+
+        def extend(partial: List) -> None:
+            k = len(partial)
+            if k == len(bag_i):
+                solutions.append(tuple(partial))
+                return
+            for value_i in candidates[k]:
+                for j in range(k):      # checks the value against the previous variables of the bag
+                    constraint = csp.findBinaryCostraint(bag_i[k], bag_i[j])
+                    if constraint is not None and not constraint(value_i, partial[j]):
+                        break
+                else:
+                    partial.append(value_i)
+                    extend(partial)
+                    partial.pop()
+
+        extend([])
+        return solutions
+
+    def nullAssignment() -> Assignment:
+        null = Assignment()
+        null.setNull()
+        return null
+
+    if domains is None:
+        domains = Domains(csp.getVariables())
+    bags, parents, width = treeDecomposition(csp, minFill=minFill)
+    if not AC3(csp, domains, stats):
+        return nullAssignment(), width
+
+    separators = []     # positions, in the child bag and in the parent bag, of the variables they share
+    for i in range(len(bags)):
+        if parents[i] == -1:
+            separators.append(([], []))
+        else:
+            parentBag = bags[parents[i]]
+            shared = [var for var in bags[i] if var in parentBag]
+            separators.append(([bags[i].index(var) for var in shared], [parentBag.index(var) for var in shared]))
+
+    tables = [bagSolutions(bag) for bag in bags]
+    for i in range(len(bags)):      # DAC over the join tree: a parent is always eliminated after its children
+        if len(tables[i]) == 0:
+            return nullAssignment(), width
+        if parents[i] != -1:
+            childPositions, parentPositions = separators[i]
+            supported = {tuple(row[k] for k in childPositions) for row in tables[i]}
+            tables[parents[i]] = [row for row in tables[parents[i]] if tuple(row[k] for k in parentPositions) in supported]
+
+    chosen: List[Optional[tuple]] = [None] * len(bags)
+    for i in range(len(bags) - 1, -1, -1):      # every bag takes the first row compatible with its parent's one
+        if parents[i] == -1:
+            chosen[i] = tables[i][0]
+        else:
+            childPositions, parentPositions = separators[i]
+            key = tuple(chosen[parents[i]][k] for k in parentPositions)
+            for row in tables[i]:
+                if tuple(row[k] for k in childPositions) == key:
+                    chosen[i] = row
+                    break
+
+    assignment = Assignment()
+    for i in range(len(bags)):
+        assignment.addVarAssigned(bags[i][0], chosen[i][0])
+    return assignment, width
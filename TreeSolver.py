@@ -1,87 +1,195 @@
-from typing import Union
+from typing import Union, Tuple
+from timeit import default_timer as timer
+
+import numpy as np
 
 from AC3 import revise
 from CSP import *
+from Domains import Domains
+from Stats import SolverStats
 
 
-def topSort(csp: CSP, root: Variable) -> List[Variable]:
+def topSort(csp: Union[CSP, SubproblemView], root: Variable) -> Tuple[List[Variable], List[int]]:
     """
     Given a csp, it searches for a "topological sort" (running a DFS). It needs a variable from which starting, because induced graph isn't a direct graph, so
     the real topological sort isn't defined
+    Execution time: O(n) for a tree
     :param csp: csp of interest
     :param root: variable from which it starts
-    :return: Order list of csp's variables
+    :return: Order list of csp's variables and, for every position, the index of its parent in that list (-1 for the root)
     :raise Exception: if the graph induced isn't a tree (it is cyclic or not connected)
     """
+    sequence = []
+    parents = []
+    position: Dict[Variable, int] = {}
+    stack = [(root, -1)]
+    while len(stack) != 0:      # iterative DFS, so deep trees don't hit the recursion limit
+        var, parent = stack.pop()
+        if var in position:     # reached twice: there is a cycle
+            raise Exception
+        position[var] = len(sequence)
+        sequence.append(var)
+        parents.append(parent)
+        for child in csp.getBinaryConstraintsForVar(var):
+            if parent == -1 or child is not sequence[parent]:     # discards the edge to the parent
+                if child in position:
+                    raise Exception     # It isn't a tree: a child has already been visited
+                stack.append((child, position[var]))
 
-    def _topSort(csp_i: CSP, root_i: Variable, previous: List[Variable]) -> List[Variable]:
-        """
-        Adds to the list the subroot and iterates
-        :param csp_i:  csp of interest
-        :param root_i: variable from which it starts
-        :param previous: already elaborated nodes
-        :return: updated list
-        """
-        children = []
-        for couple in csp_i.getNeighbour(root_i):  # check for every edges involving root
-            if couple[0] == root_i:  # discards dual edges
-                if couple[1] not in previous:  # if the other node is not in list, it is a child
-                    children.append(couple[1])
-        previous.append(root_i)  # adding the root to list...
-        for var in children:
-            _topSort(csp_i, var, previous)  # ... before to iterate for children
-        return previous
-
-    sequence = _topSort(csp, root, [])
-    if len(sequence) == len(csp.getVariables()) and len(sequence) == len(set(sequence)):
-        return sequence
+    if len(sequence) == csp.countVariables():
+        return sequence, parents
     else:
         raise Exception  # It isn't a tree: EVERY var has to be ONE AND ONLY ONE time in the sequence
 
 
-def treeSolver(csp: CSP) -> Assignment:
+def treeSolver(csp: Union[CSP, SubproblemView], domains: Domains = None, stats: SolverStats = None) -> Assignment:
     """
     Finds a possible assignment for tree-like csp
     Execution time: O(nd^2) d=max cardinality
-    :param csp:  csp of interest
+    :param csp:  csp of interest, or a view of a subproblem
+    :param domains: store of the actual domains to prune; if None, a local copy is used and the csp's variables are left untouched
+    :param stats: statistics to update (time in phase 'treeSolve'); if None, nothing is counted
     :return: an assignment, eventually null if the problem is unsatisfiable
     """
-    def DAC(csp_i: CSP, sequence_i: List[Variable]) -> bool:
+    def DAC(csp_i: CSP, sequence_i: List[Variable], parents_i: List[int]) -> bool:
         """
         Directional Arc Consistency. Does inference over the domain, from the leaf to the root of the graph
         Execution time: O(nd^2) d=max cardinality
         :param csp_i: csp of interest
         :param sequence_i: topological order
+        :param parents_i: index of the parent of every variable in the topological order
         :return False if the csp is unsatisfiable, True otherwise
         """
         for i in range(len(sequence_i) - 1, -1, -1):
-            for j in range(i-1, -1, -1):
-                constraint = csp_i.findBinaryCostraint(sequence_i[j], sequence_i[i])
-                if constraint is not None:
-                    revise(sequence_i[j], constraint, sequence_i[i])
-            if sequence_i[i].getActualDomainSize() == 0:
+            if parents_i[i] != -1:      # each variable is revised only against its own parent
+                parent = sequence_i[parents_i[i]]
+                revise(parent, csp_i.findBinaryCostraint(parent, sequence_i[i]), sequence_i[i], domains, stats)
+            if domains.getActualDomainSize(sequence_i[i]) == 0:
                 return False
         return True
 
-    assignment = Assignment()
+    def consistentValue(csp_i: CSP, var_i: Variable, value_i: Any, parent_i: Optional[Variable], parentValue_i: Any) -> bool:
+        """
+        Checks a value for a variable against its unary constraints and the value already assigned to its parent,
+        that is the only neighbour assigned before it in topological order
+        :param csp_i: csp of interest
+        :param var_i: variable
+        :param value_i: value to check
+        :param parent_i: parent of the variable, None for the root
+        :param parentValue_i: value assigned to the parent
+        :return: True if it is consistent, False otherwise
+        """
+        for value, constraints in csp_i.getUnaryConstraintsForVar(var_i).items():
+            if stats is not None:
+                stats.checks += 1
+            if not constraints[0](value_i, value):
+                return False
+        if parent_i is not None:
+            if stats is not None:
+                stats.checks += 1
+            return csp_i.findBinaryCostraint(var_i, parent_i)(value_i, parentValue_i)
+        return True
+
+    def nullAssignment() -> Assignment:
+        if stats is not None:
+            stats.addTime('treeSolve', timer() - start)
+            stats.exitPhase('treeSolve')
+        null = Assignment()
+        null.setNull()
+        return null
+
     root = csp.getVariables().pop()
-    sequence = topSort(csp, root)
+    sequence, parents = topSort(csp, root)      # before entering the phase, so if it raises the phase isn't left open
+    if stats is not None:
+        stats.treeSolves += 1
+        start = timer()
+        stats.enterPhase('treeSolve')
+    if domains is None:
+        domains = Domains(csp.getVariables())
+    assignment = Assignment()
 
-    if not DAC(csp, sequence):      # is unsatisfiable
-        nullAssignment = Assignment()
-        nullAssignment.setNull()
-        return nullAssignment
+    if not DAC(csp, sequence, parents):      # is unsatisfiable
+        return nullAssignment()
 
-    for var in sequence:        # for each var in order...
-        for value in var.getActualDomain():
-            assignment.addVarAssigned(var, value)      # ... we try to assign a variable...
-            if csp.assignmentConsistencyForVar(assignment, var):      # ... if the partial assignment is consistent...
+    values = []
+    for i in range(len(sequence)):        # for each var in order...
+        var = sequence[i]
+        parent = sequence[parents[i]] if parents[i] != -1 else None
+        parentValue = values[parents[i]] if parents[i] != -1 else None
+        for value in domains.getActualDomain(var):      # ... we try to assign a variable...
+            if consistentValue(csp, var, value, parent, parentValue):      # ... if it is consistent with its parent...
+                assignment.addVarAssigned(var, value)
+                values.append(value)
                 break           # ... we go to the next var
-            else:
-                assignment.removeVarAssigned(var)
         else:       # if none of the values is consistent, the csp is unsatisfiable and we return a null assignment
-            nullAssignment = Assignment()
-            nullAssignment.setNull()
-            return nullAssignment
+            return nullAssignment()
 
+    if stats is not None:
+        stats.addTime('treeSolve', timer() - start)
+        stats.exitPhase('treeSolve')
     return assignment
+
+
+def batchTreeSolver(csp: Union[CSP, SubproblemView], values: List, masks: Dict[Variable, np.ndarray], domains: Domains = None) -> Tuple[np.ndarray, List[Assignment]]:
+    """
+    Solves a batch of B instances of the same tree-like csp, that differ only for the domains of some (boundary) variables,
+    running DAC and the assignment pass for all the instances at once over (B, d) boolean matrices
+    Execution time: O(n + cd^2) Python-level work, plus O(nBd^2) vectorized work d=number of values, c=number of different constraints
+    :param csp: csp of interest (or a view of a subproblem), that gives the tree topology and the constraints
+    :param values: table of the values, that gives the meaning of the columns of the masks
+    :param masks: for every boundary variable, a (B, d) boolean array where True means the value is allowed in that instance
+    :param domains: store of the actual domains shared by all the instances; if None, the variables' actual domains are used
+    :return: a (B,) boolean array with the satisfiability of every instance and, for every instance, an assignment (null if it is unsatisfiable)
+    :raise CSPError: if a mask doesn't have the shape (B, d) or a value of an actual domain isn't in values
+    """
+    if domains is None:
+        domains = Domains(csp.getVariables())
+    index = {value: k for k, value in enumerate(values)}
+    d = len(values)
+    batch = next(iter(masks.values())).shape[0] if len(masks) != 0 else 1
+
+    sequence, parents = topSort(csp, csp.getVariables().pop())
+    n = len(sequence)
+
+    D = np.zeros((n, batch, d), dtype=bool)      # D[i, b, k] is True if values[k] is in the domain of sequence[i] in instance b
+    for i in range(n):
+        var = sequence[i]
+        unaryConstraints = list(csp.getUnaryConstraintsForVar(var).items())
+        for value in domains.getActualDomain(var):
+            if value not in index:
+                raise CSPError
+            if all(constraints[0](value, v) for v, constraints in unaryConstraints):
+                D[i, :, index[value]] = True
+        if var in masks:
+            if masks[var].shape != (batch, d):
+                raise CSPError
+            D[i] &= masks[var]
+
+    relations = [None] * n       # relations[i][x, y] is True if parent's values[x] and child's values[y] are compatible
+    matrices: Dict[Constraint, np.ndarray] = {}      # constraints are interned, so the same few matrices are shared by all the edges
+    for i in range(1, n):
+        constraint = csp.findBinaryCostraint(sequence[parents[i]], sequence[i])
+        if constraint not in matrices:
+            matrices[constraint] = np.array([[constraint(x, y) for y in values] for x in values], dtype=bool)
+        relations[i] = matrices[constraint]
+
+    for i in range(n - 1, 0, -1):       # DAC, for every instance at once
+        D[parents[i]] &= np.matmul(D[i], relations[i].T)
+
+    satisfiable = D.any(axis=2).all(axis=0)
+
+    chosen = np.zeros((n, batch), dtype=np.intp)
+    chosen[0] = D[0].argmax(axis=1)
+    for i in range(1, n):       # every var takes the first value compatible with its parent's one
+        chosen[i] = (D[i] & relations[i][chosen[parents[i]]]).argmax(axis=1)
+
+    assignments = []
+    for b in range(batch):
+        assignment = Assignment()
+        if satisfiable[b]:
+            for i in range(n):
+                assignment.addVarAssigned(sequence[i], values[chosen[i, b]])
+        else:
+            assignment.setNull()
+        assignments.append(assignment)
+    return satisfiable, assignments
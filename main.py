@@ -1,86 +1,110 @@
-from Cutset import cutset
-from Backtrack import backtrack
-from Map import *
-
-import numpy as np
-from timeit import default_timer as timer
-
-import winsound
-frequency = 2500
-duration = 1000
-
-NUMBER_OF_TESTS = 5
-NUMBER_OF_VARIABLES = 500
-STEP = 25
-
-
-def test(*, minimalCutsetSize=1):
-    y_bt = np.zeros(int(NUMBER_OF_VARIABLES / STEP)+1)
-    y_cs = np.zeros(int(NUMBER_OF_VARIABLES / STEP)+1)
-    y_sizeCs = np.zeros(int(NUMBER_OF_VARIABLES / STEP)+1)
-    y_cs_h = np.zeros(int(NUMBER_OF_VARIABLES / STEP)+1)
-    y_sizeCs_h = np.zeros(int(NUMBER_OF_VARIABLES / STEP)+1)
-    x = np.arange(0, NUMBER_OF_VARIABLES+1, STEP)
-
-    for i in range(NUMBER_OF_TESTS):
-        for dimension in range(STEP, NUMBER_OF_VARIABLES+1, STEP):
-            print('testing: ' + str(dimension) + ' #' + str(i+1), end=' ')
-
-            map = generateMap(dimension, minimalCutsetSize=minimalCutsetSize)
-            csp = map.toCSP()
-
-            print('start')
-
-            start = timer()
-            solBt = backtrack(csp)
-            end = timer()
-            timeBt = end-start
-
-            start = timer()
-            solCs, size = cutset(csp, heuristic=False)
-            end = timer()
-            timeCs = end-start
-
-            start = timer()
-            solCs_h, size_h = cutset(csp)
-            print(size_h)
-            end = timer()
-            timeCs_h = end-start
-
-            y_sizeCs[int(dimension/STEP)] += dimension-size
-            y_sizeCs_h[int(dimension/STEP)] += dimension-size_h
-            y_bt[int(dimension/STEP)] += timeBt
-            y_cs[int(dimension/STEP)] += timeCs
-            y_cs_h[int(dimension/STEP)] += timeCs_h
-
-    winsound.Beep(frequency, duration)
-
-    y_sizeCs /= NUMBER_OF_TESTS
-    y_sizeCs_h /= NUMBER_OF_TESTS
-    y_bt /= NUMBER_OF_TESTS
-    y_cs /= NUMBER_OF_TESTS
-    y_cs_h /= NUMBER_OF_TESTS
-
-    # PLOT SOLVING TIME
-    plt.plot(x, y_bt)
-    plt.plot(x, y_cs)
-    plt.plot(x, y_cs_h)
-    plt.legend(['Backtrack', 'Cutset senza euristica', 'Cutset con euristica'])
-    plt.title('Tempo di risoluzione: backtrack vs cutset')
-    plt.xlabel('Numero di variabili')
-    plt.ylabel('Tempo (secondi)')
-    plt.show()
-
-    # PLOT CUTSET SIZE
-    plt.plot(x, y_sizeCs)
-    plt.plot(x, y_sizeCs_h)
-    plt.legend(['Cutset senza euristica', 'Cutset con euristica'])
-    plt.title('Dimensione cutset effettivo')
-    plt.xlabel('Numero di variabili')
-    plt.ylabel('Tempo (secondi)')
-    plt.show()
+import argparse
+import sys
+from typing import List
+
+from Benchmark import *
+from Regression import *
+
+
+def parseRange(text: str) -> List[int]:
+    """
+    :param text: list of integers separated by commas, where "a:b:c" is range(a, b+1, c) and "a:b" is range(a, b+1)
+    :return: integers
+    """
+    values = []
+    for field in text.split(','):
+        if ':' in field:
+            bounds = [int(bound) for bound in field.split(':')]
+            values.extend(range(bounds[0], bounds[1] + 1, bounds[2] if len(bounds) > 2 else 1))
+        else:
+            values.append(int(field))
+    return values
+
+
+def main(arguments: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description='Benchmark of the CSP solvers on generated maps and DIMACS instances')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='runs the benchmark and writes the results')
+    run.add_argument('--solvers', nargs='+', default=['backtrack', 'cutset-random', 'cutset'], choices=sorted(SOLVERS))
+    run.add_argument('--sizes', type=parseRange, default=parseRange('25:500:25'), help='numbers of regions, e.g. 25:500:25 or 100,200')
+    run.add_argument('--seeds', type=parseRange, default=parseRange('0:4'), help='seeds of the maps, e.g. 0:4')
+    run.add_argument('--minimal-cutset-size', type=int, default=1)
+    run.add_argument('--colors', type=int, default=4)
+    run.add_argument('--repeats', type=int, default=5)
+    run.add_argument('--warmup', type=int, default=1)
+    run.add_argument('--corpus', default='corpus', help='directory of the generated maps')
+    run.add_argument('--fast', action='store_true', help="generates the maps with generateMap's nearest-neighbour mode")
+    run.add_argument('--dimacs', nargs='*', default=[], help='DIMACS .col files to solve after the maps')
+    run.add_argument('--json', default='results.json')
+    run.add_argument('--csv', default=None)
+    run.add_argument('--stats', action='store_true', help="collects the solvers' statistics in one more run (JSON only)")
+    run.add_argument('--profile-memory', action='store_true', help="profiles the memory of the solvers' phases with tracemalloc in one more run (JSON only)")
+    run.add_argument('--processes', type=int, default=0, help='if positive, every (instance, solver) job runs in its own process, with at most this number of jobs at the same time')
+    run.add_argument('--timeout', type=float, default=None, help='maximum seconds of a job (only with --processes)')
+    run.add_argument('--memory', type=int, default=None, help='maximum megabytes of a job (only with --processes)')
+    run.add_argument('--no-pin', action='store_true', help="doesn't pin the processes to the cpus (only with --processes)")
+    run.add_argument('--stream', default='results.jsonl', help='file where the results are appended as the jobs end; a run with the same file resumes it (only with --processes)')
+
+    plot = commands.add_parser('plot', help='plots the results of a previous run')
+    plot.add_argument('results', help='JSON file written by run')
+    plot.add_argument('--output', default='.', help='directory of the images')
+
+    regression = commands.add_parser('regression', help='checks the solvers and compares them with the stored baseline; exits with 1 if a check fails or a metric regresses')
+    regression.add_argument('--baseline', default=BASELINE)
+    regression.add_argument('--update', action='store_true', help='records the actual results as the new baseline')
+    regression.add_argument('--repeats', type=int, default=9)
+    regression.add_argument('--threshold', nargs='*', default=[], metavar='METRIC=VALUE',
+                            help='maximum relative increase of a metric (time, checks, nodes), e.g. time=0.3')
+
+    trace = commands.add_parser('trace', help='solves a map writing the search events to a file')
+    trace.add_argument('--solver', default='cutset', choices=sorted(TRACED_SOLVERS))
+    trace.add_argument('--size', type=int, default=50, help='number of regions')
+    trace.add_argument('--seed', type=int, default=0)
+    trace.add_argument('--minimal-cutset-size', type=int, default=1)
+    trace.add_argument('--colors', type=int, default=4)
+    trace.add_argument('--corpus', default='corpus', help='directory of the generated maps')
+    trace.add_argument('--dimacs', default=None, help='DIMACS .col file to solve instead of a map')
+    trace.add_argument('--binary', action='store_true', help='writes a compact binary log instead of Chrome trace-event JSON')
+    trace.add_argument('--output', default='trace.json')
+
+    args = parser.parse_args(arguments)
+    if args.command == 'run':
+        if args.processes > 0:
+            results = runParallel(args.solvers, args.sizes, args.seeds, minimalCutsetSize=args.minimal_cutset_size, numColor=args.colors,
+                                  repeats=args.repeats, warmup=args.warmup, corpus=Corpus(args.corpus), fast=args.fast, files=args.dimacs,
+                                  stats=args.stats, profileMemory=args.profile_memory, processes=args.processes, timeout=args.timeout, memory=None if args.memory is None else args.memory * 2**20,
+                                  pin=not args.no_pin, output=args.stream)
+        else:
+            results = runBenchmark(args.solvers, args.sizes, args.seeds, minimalCutsetSize=args.minimal_cutset_size, numColor=args.colors,
+                                   repeats=args.repeats, warmup=args.warmup, corpus=Corpus(args.corpus), fast=args.fast, files=args.dimacs,
+                                   stats=args.stats, profileMemory=args.profile_memory)
+        writeJSON(results, args.json)
+        if args.csv is not None:
+            writeCSV(results, args.csv)
+    elif args.command == 'plot':
+        plotResults(args.results, args.output)
+    elif args.command == 'trace':
+        if args.dimacs is not None:
+            source = ('dimacs', args.dimacs, args.colors)
+        else:
+            source = ('map', args.corpus, args.size, args.colors, args.minimal_cutset_size, args.seed, False)
+        traceSolver(args.solver, builder(source), args.output, binary=args.binary)
+    else:
+        if args.update:
+            updateBaseline(args.baseline, repeats=args.repeats)
+            return
+        thresholds = {}
+        for threshold in args.threshold:
+            metric, value = threshold.split('=')
+            if metric not in METRICS:
+                parser.error('unknown metric ' + metric)
+            thresholds[metric] = float(value)
+        regressions = checkCorrectness() + checkBaseline(args.baseline, thresholds=thresholds, repeats=args.repeats)
+        if len(regressions) != 0:
+            print('\n'.join(regressions))
+            sys.exit(1)
 
 
 if __name__ == "__main__":
-    test(minimalCutsetSize=1)
-    test(minimalCutsetSize=2)
+    main()